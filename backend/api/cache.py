@@ -0,0 +1,105 @@
+from hashlib import sha1
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+GENERATION_KEY = 'generation:{}'
+
+
+def get_generation(name):
+    """
+    Текущее поколение данных name. Хранится в кеше Django, поэтому при
+    общем бэкенде кеша видно всем процессам.
+    """
+    return cache.get_or_set(GENERATION_KEY.format(name), uuid4().hex, None)
+
+
+def bump_generation(name):
+    """Сменить поколение name после фиксации текущей транзакции."""
+    transaction.on_commit(
+        lambda: cache.set(GENERATION_KEY.format(name), uuid4().hex, None)
+    )
+
+
+class CachedListMixin:
+    """
+    Отдаёт список объектов из кеша процесса в виде готового JSON.
+
+    Кеш привязан к поколению cache_name: сигналы сохранения и удаления
+    моделей меняют поколение, и список сериализуется заново. Ответ
+    содержит ETag, повторный запрос с If-None-Match получает 304.
+    """
+    cache_name = None
+    _cached_lists = {}
+
+    def render_list(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return JSONRenderer().render(serializer.data)
+
+    def cached_list(self):
+        generation = get_generation(self.cache_name)
+        entry = self._cached_lists.get(self.cache_name)
+        if entry is None or entry[0] != generation:
+            content = self.render_list()
+            etag = f'"{sha1(content).hexdigest()}"'
+            entry = generation, content, etag
+            CachedListMixin._cached_lists[self.cache_name] = entry
+        return entry[1], entry[2]
+
+    def list(self, request, *args, **kwargs):
+        content, etag = self.cached_list()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+class AnonymousListCacheMixin:
+    """
+    Кеширует данные списка для анонимных пользователей: ответ для них
+    одинаков и зависит только от параметров запроса. Ключ включает
+    поколение cache_name, которое меняют сигналы моделей из ответа.
+    Запросы с параметрами из cache_skipped_params не кешируются: их
+    выдача меняется без смены поколения, например сортировка по
+    рейтингу. Бэкенд кеша задаётся настройкой RESPONSE_CACHE_ALIAS.
+    """
+    cache_name = None
+    cache_ignored_params = ()
+    cache_skipped_params = ()
+
+    def get_list_cache_key(self, request):
+        params = urlencode(sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            if key not in self.cache_ignored_params
+            for value in values
+        ))
+        digest = sha1(
+            f'{request.build_absolute_uri("/")}?{params}'.encode()
+        ).hexdigest()
+        return f'{self.cache_name}:{get_generation(self.cache_name)}:{digest}'
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_anonymous or any(
+                param in request.query_params
+                for param in self.cache_skipped_params):
+            return super().list(request, *args, **kwargs)
+        response_cache = caches[settings.RESPONSE_CACHE_ALIAS]
+        key = self.get_list_cache_key(request)
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.set(key, response.data,
+                               settings.RESPONSE_CACHE_TIMEOUT)
+        return response
@@ -2,12 +2,20 @@ from base64 import b64decode
 from imghdr import what
 from uuid import uuid4
 
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
-from django.core.files.base import ContentFile
+from foodgram.images import RENDITIONS
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Фото в виде строки base64 или файла из multipart/form-data
+    размером не больше RECIPE_IMAGE_MAX_SIZE.
+    """
+
     def to_internal_value(self, data):
         if isinstance(data, str):
             if 'data:' in data and ';base64,' in data:
@@ -21,8 +29,36 @@ class Base64ImageField(serializers.ImageField):
             file_extension = self.get_file_extension(file_name, decoded_file)
             complete_file_name = f'{file_name}.{file_extension}'
             data = ContentFile(decoded_file, name=complete_file_name)
+        if getattr(data, 'size', 0) > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Размер файла превышает допустимый')
         return super().to_internal_value(data)
 
     def get_file_extension(self, file_name, decoded_file):
         extension = what(file_name, decoded_file)
         return 'jpg' if extension == 'jpeg' else extension
+
+
+class ImageRenditionsField(serializers.Field):
+    """
+    Ссылки на варианты фото рецепта. Пока варианты не готовы, вместо них
+    отдаётся исходное фото.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        request = self.context.get('request')
+        renditions = recipe.image_renditions
+        if renditions.get('source') != recipe.image.name:
+            renditions = {}
+        result = {}
+        for name in RENDITIONS:
+            url = (default_storage.url(renditions[name])
+                   if name in renditions else recipe.image.url)
+            result[name] = request.build_absolute_uri(url) if request else url
+        return result
@@ -1,22 +1,74 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
-from foodgram.models import Recipe
+from api.cache import get_generation
+from foodgram.models import Recipe, Tag
+from foodgram.search import search_recipes
 
 User = get_user_model()
 
+_tag_ids = {}
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+
+def tag_ids_by_slug():
+    """
+    Словарь slug -> id тегов, закешированный в процессе до смены
+    поколения tags.
+    """
+    generation = get_generation('tags')
+    cached = _tag_ids.get('tags')
+    if cached is None or cached[0] != generation:
+        cached = generation, dict(Tag.objects.values_list('slug', 'id'))
+        _tag_ids['tags'] = cached
+    return cached[1]
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids_by_slug()]
 
 
 class AuthorAndTagFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(choices=tag_choices,
+                                        method='filter_tags')
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'), ('trending', 'trending')),
+        method='filter_ordering')
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов: полусоединение с таблицей связей
+        по уникальному индексу (recipe_id, tag_id) без дублей строк.
+        """
+        tag_ids = tag_ids_by_slug()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag_id__in=[tag_ids[slug] for slug in value
+                            if slug in tag_ids],
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        Сортировка по рейтингу из RecipeScore: внутреннее соединение и
+        порядок (рейтинг, recipe_id) строки рейтинга, чтобы выдачу и
+        позицию курсора вёл индекс (-рейтинг, -recipe). Строку рейтинга
+        имеет каждый рецепт: её создаёт сигнал post_save, а для
+        bulk_create — import_data и update_recipe_scores.
+        """
+        return queryset.filter(score__isnull=False).annotate(
+            ranking=F(f'score__{value}'),
+            ranked_id=F('score__recipe'),
+        ).order_by('-ranking', '-ranked_id')
 
     def filter_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
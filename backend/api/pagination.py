@@ -1,6 +1,188 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from collections import OrderedDict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.fields import BooleanField
+from rest_framework.pagination import (CursorPagination, PageNumberPagination,
+                                       _reverse_ordering)
+from rest_framework.response import Response
+
+
+class LimitCursorPagination(CursorPagination):
+    """
+    Постраничная выдача по курсору на ключе -id или на порядке, заданном
+    фильтрами: каждая страница — диапазонное сканирование индекса без
+    COUNT и OFFSET. Позиция курсора составная — значения всех полей
+    сортировки, последним из которых идёт уникальное, поэтому рецепты с равным
+    рейтингом не листаются через OFFSET. Общее число объектов считается
+    только по запросу ?count=true.
+    """
+    page_size = 4
+    page_size_query_param = 'limit'
+    ordering = '-id'
+    count_query_param = 'count'
+    count = None
+    # Поля с уникальными значениями, завершающие позицию курсора:
+    # ranked_id — id рецепта из строки рейтинга, см. filter_ordering.
+    unique_fields = {'id', 'pk', 'ranked_id'}
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Порядок, заданный фильтрами (например ?ordering=popular), иначе
+        ordering класса; без уникального поля в конец добавляется -id.
+        """
+        ordering = queryset.query.order_by
+        if not ordering or not all(
+                isinstance(field, str) for field in ordering):
+            ordering = super().get_ordering(request, queryset, view)
+        ordering = tuple(ordering)
+        if not self.unique_fields & {field.lstrip('-') for field in ordering}:
+            ordering += ('-id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count = request.query_params.get(self.count_query_param)
+        if count in BooleanField.TRUE_VALUES:
+            self.count = queryset.count()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+        ordering = self.ordering
+        if reverse:
+            ordering = _reverse_ordering(ordering)
+        results = self.get_results(queryset, ordering, position, offset)
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(
+                results[-1], self.ordering)
+        has_position = position is not None or offset > 0
+        if reverse:
+            self.has_next = has_position
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+            self.page.reverse()
+        else:
+            self.has_next = following is not None
+            self.has_previous = has_position
+            self.next_position, self.previous_position = following, position
+        return self.page
+
+    def get_results(self, queryset, ordering, position, offset):
+        """Объекты страницы после позиции и ещё один следующий за ними."""
+        if position is not None:
+            queryset = queryset.filter(
+                self.position_filter(ordering, position))
+        return list(queryset.order_by(*ordering)[
+            offset:offset + self.page_size + 1])
+
+    def position_filter(self, ordering, position):
+        """
+        Условие «после позиции» для составного ключа (a, b, id):
+        a < x или a = x и b < y или ... Первое поле дополнительно
+        ограничено диапазоном, чтобы запрос шёл по индексу.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        fields = [field.lstrip('-') for field in ordering]
+        lookups = ['lt' if field.startswith('-') else 'gt'
+                   for field in ordering]
+        condition = Q()
+        for i, (field, lookup) in enumerate(zip(fields, lookups)):
+            condition |= Q(
+                **dict(zip(fields[:i], values[:i])),
+                **{f'{field}__{lookup}': values[i]},
+            )
+        if len(fields) == 1:
+            return condition
+        bound = {'lt': 'lte', 'gt': 'gte'}[lookups[0]]
+        return Q(**{f'{fields[0]}__{bound}': values[0]}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[field] if isinstance(instance, dict)
+            else getattr(instance, field)
+            for field in (field.lstrip('-') for field in ordering)
+        ]
+        return json.dumps(values, cls=DjangoJSONEncoder)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+
+class MergedCursorPagination(LimitCursorPagination):
+    """
+    Выдача по курсору на ключе -id, сливающая несколько источников: из
+    каждого берётся не больше страницы id своим индексным просмотром,
+    id объединяются, и объекты страницы читаются одним запросом. Общее
+    число объектов не считается.
+    """
+    count_query_param = None
+    sources = ()
+
+    def get_ordering(self, request, queryset, view):
+        return (self.ordering,)
+
+    def paginate_sources(self, queryset, sources, request, view=None):
+        """Страница queryset из объектов, найденных в sources."""
+        self.sources = sources
+        return self.paginate_queryset(queryset, request, view)
+
+    def get_results(self, queryset, ordering, position, offset):
+        limit = offset + self.page_size + 1
+        ids = set()
+        for source in self.sources:
+            if position is not None:
+                source = source.filter(
+                    self.position_filter(ordering, position))
+            ids.update(source.order_by(*ordering).values_list(
+                'id', flat=True)[:limit])
+        ids = sorted(ids, reverse=ordering[0].startswith('-'))
+        return list(queryset.filter(id__in=ids[offset:limit]).order_by(
+            *ordering))
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная выдача по номеру страницы. С параметром
+    ?pagination=cursor или ?cursor= переключается на выдачу по курсору.
+    """
     page_size = 4
     page_size_query_param = 'limit'
+    cursor_pagination_class = LimitCursorPagination
+    cursor_paginator = None
+
+    def is_cursor_requested(self, request):
+        return (
+            request.query_params.get('pagination') == 'cursor'
+            or self.cursor_pagination_class.cursor_query_param
+            in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_requested(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
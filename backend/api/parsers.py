@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер файла превышает допустимый'
+    default_code = 'request_too_large'
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Прерывает загрузку, как только файл превысил max_size. Стоит первым
+    в цепочке, дальше данные потоково пишутся во временный файл.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.exceeded = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=False)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def upload_complete(self):
+        if self.exceeded:
+            raise RequestTooLarge()
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    """multipart/form-data с ограничением размера загружаемого фото."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > max_size + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise RequestTooLarge()
+        handler = MaxSizeUploadHandler(request._request, max_size)
+        request._request.upload_handlers = [
+            handler, *request._request.upload_handlers
+        ]
+        return super().parse(stream, media_type, parser_context)
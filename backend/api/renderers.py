@@ -0,0 +1,45 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class FileContentNegotiation(DefaultContentNegotiation):
+    """
+    Выбор формата выгружаемого файла. Формат задаётся через ?format=,
+    а Accept, который не подходит ни одному рендереру (например,
+    application/json от клиента API), не даёт 406: отдаётся первый
+    рендерер вьюхи.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+class FileRenderer(BaseRenderer):
+    """
+    Рендерер для выгрузки файлов. Содержимое файла формирует сама вьюха,
+    рендерер нужен для выбора формата через ?format= и сериализует только
+    ответы с ошибками.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class PDFRenderer(FileRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class CSVRenderer(FileRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PlainTextRenderer(FileRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
@@ -1,10 +1,15 @@
-from django.shortcuts import get_object_or_404
+import json
+
+from django.db import transaction
+from django.http import QueryDict
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from rest_framework.validators import UniqueTogetherValidator
 
-from api.fields import Base64ImageField
+from api.fields import Base64ImageField, ImageRenditionsField
 from foodgram.models import (Cart, Favorite, Ingredient, Recipe,
-                             RecipeIngredient, Tag)
+                             RecipeIngredient, ShoppingListItem, Tag)
+from foodgram.search import COOK_LIMIT, COOK_MIN_COVERAGE
 from users.models import Follow
 from users.serializers import CustomUserSerializer
 
@@ -47,6 +52,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор модели Рецепт."""
     image = Base64ImageField(max_length=None, use_url=True)
+    image_renditions = ImageRenditionsField(source='*')
     tags = TagSerializer(read_only=True, many=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
@@ -60,25 +66,52 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+                  'text', 'cooking_time')
         read_only_fields = ('author', 'tags',)
 
+    def to_representation(self, recipe):
+        if hasattr(recipe, 'author_is_subscribed'):
+            recipe.author.is_subscribed = recipe.author_is_subscribed
+        return super().to_representation(recipe)
+
     def get_is_favorited(self, obj):
         """Проверка добавлен ли рецепт в избранное."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Recipe.objects.filter(favorites__user=user, id=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Recipe.objects.filter(cart__user=user, id=obj.id).exists()
 
+    def get_initial_list(self, name):
+        """
+        Список из исходных данных. В multipart/form-data значения
+        передаются повторением поля или строкой JSON.
+        """
+        if not isinstance(self.initial_data, QueryDict):
+            return self.initial_data.get(name)
+        items = []
+        for value in self.initial_data.getlist(name):
+            if value.lstrip().startswith(('[', '{')):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {name: 'Некорректный JSON'})
+            items.extend(value if isinstance(value, list) else [value])
+        return items
+
     def validate(self, data):
-        tags = self.initial_data.get("tags")
+        tags = self.get_initial_list("tags")
         if not tags:
             raise serializers.ValidationError(
                 "Убедитесь, что добавлен хотя бы один тег"
@@ -87,25 +120,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Теги должны быть уникальными")
         data["tags"] = tags
 
-        ingredients = self.initial_data.get("ingredients")
-        if not ingredients or len(ingredients) < 1:
-            raise serializers.ValidationError(
-                "Нужен хоть один ингридиент для рецепта"
-            )
-        ingredient_list = []
-        for ingredient_item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=ingredient_item["id"]
-            )
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    "Ингридиенты должны быть уникальными"
-                )
-            ingredient_list.append(ingredient)
-            if int(ingredient_item["amount"]) <= 0:
-                raise serializers.ValidationError(
-                    "Убедитесь, что значение количества ингредиента больше 0"
-                )
+        ingredients = self.get_initial_list("ingredients")
+        self.check_ingredients(ingredients)
         data["ingredients"] = ingredients
 
         cooking_time = self.initial_data.get("cooking_time")
@@ -116,14 +132,75 @@ class RecipeSerializer(serializers.ModelSerializer):
         data["cooking_time"] = cooking_time
         return data
 
+    def check_ingredients(self, ingredients):
+        """Проверка ингредиентов рецепта одним запросом к БД."""
+        if not ingredients or len(ingredients) < 1:
+            raise serializers.ValidationError(
+                "Нужен хоть один ингридиент для рецепта"
+            )
+        try:
+            ingredient_ids = [int(item["id"]) for item in ingredients]
+            amounts = [int(item["amount"]) for item in ingredients]
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                "Укажите id и количество каждого ингридиента"
+            )
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                "Ингридиенты должны быть уникальными"
+            )
+        found = Ingredient.objects.only('id').in_bulk(ingredient_ids)
+        if len(found) != len(ingredient_ids):
+            raise NotFound("Ингридиент не найден")
+        if any(amount <= 0 for amount in amounts):
+            raise serializers.ValidationError(
+                "Убедитесь, что значение количества ингредиента больше 0"
+            )
+
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.create(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
                 ingredient_id=ingredient.get("id"),
                 amount=ingredient.get("amount"),
             )
-
+            for ingredient in ingredients
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Применяет разницу между текущими и новыми ингредиентами рецепта:
+        неизменные строки не перезаписываются. Удалённые строки снимает
+        со списков покупок сигнал post_delete, изменённые и новые пишутся
+        bulk-запросами без сигналов и учитываются здесь.
+        """
+        current = {item.ingredient_id: item
+                   for item in recipe.recipe_ingredient.all()}
+        new_amounts = {int(item["id"]): int(item["amount"])
+                       for item in ingredients}
+        old_amounts = {pk: item.amount for pk, item in current.items()
+                       if pk in new_amounts}
+        removed = [item.id for pk, item in current.items()
+                   if pk not in new_amounts]
+        changed = []
+        for pk, item in current.items():
+            if pk in new_amounts and item.amount != new_amounts[pk]:
+                item.amount = new_amounts[pk]
+                changed.append(item)
+        added = [
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in new_amounts.items() if pk not in current
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        ShoppingListItem.objects.change_recipe(
+            recipe, old_amounts, new_amounts)
+
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         tags_data = validated_data.pop('tags')
@@ -133,11 +210,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags_data)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         if "ingredients" in self.initial_data:
             ingredients = validated_data.pop("ingredients")
-            recipe.ingredients.clear()
-            self.create_ingredients(ingredients, recipe)
+            self.update_ingredients(ingredients, recipe)
         if "tags" in self.initial_data:
             tags_data = validated_data.pop("tags")
             recipe.tags.set(tags_data)
@@ -147,10 +224,11 @@ class RecipeSerializer(serializers.ModelSerializer):
 class CropRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор выдает только необходимые поля."""
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField(source='*')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -159,11 +237,13 @@ class FavoriteSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
     image = Base64ImageField(source='recipe.image', read_only=True)
+    image_renditions = ImageRenditionsField(source='recipe')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
         model = Favorite
-        fields = ('id', 'name', 'image', 'cooking_time', 'user', 'recipe')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time',
+                  'user', 'recipe')
         extra_kwargs = {'user': {'write_only': True},
                         'recipe': {'write_only': True}}
 
@@ -180,11 +260,13 @@ class CartSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
     image = Base64ImageField(source='recipe.image', read_only=True)
+    image_renditions = ImageRenditionsField(source='recipe')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
         model = Cart
-        fields = ('id', 'name', 'image', 'cooking_time', 'user', 'recipe')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time',
+                  'user', 'recipe')
         extra_kwargs = {'user': {'write_only': True},
                         'recipe': {'write_only': True}}
 
@@ -214,17 +296,32 @@ class FollowSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        """Объект подписки существует, значит пользователь подписан."""
+        return True
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
+        if hasattr(obj.author, 'recipes_preview'):
+            queryset = obj.author.recipes_preview
+        else:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            queryset = Recipe.objects.filter(author=obj.author)
+            if limit:
+                queryset = queryset[:int(limit)]
         return CropRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
+        if getattr(obj, 'recipes_count', None) is not None:
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj.author).count()
+
+
+class CookQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=500)
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=COOK_MIN_COVERAGE)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=100, default=COOK_LIMIT)
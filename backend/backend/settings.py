@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'colorfield',
     'rest_framework',
     'rest_framework.authtoken',
@@ -109,6 +110,19 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', default='default')
+RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_TIMEOUT', default=10 * 60))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -161,6 +175,19 @@ REST_FRAMEWORK = {
     ],
 }
 
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', default=2))
+PDF_CACHE_TIMEOUT = int(os.getenv('PDF_CACHE_TIMEOUT', default=60 * 60))
+
+IMAGE_RENDITION_WORKERS = int(
+    os.getenv('IMAGE_RENDITION_WORKERS', default=2))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024))
+
+FEED_PULL_THRESHOLD = int(os.getenv('FEED_PULL_THRESHOLD', default=10000))
+
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', default=7))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
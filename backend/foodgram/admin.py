@@ -6,20 +6,24 @@ from foodgram.models import (Cart, Favorite, Ingredient, Recipe,
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'color', 'slug')
+    search_fields = ('name', 'slug')
     empty_value_display = "-пусто-"
 
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    search_fields = ('^name',)
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
 class RecipeIngredientInline(admin.TabularInline):
     """
     Для отображения в админке поля ManyToMany ингредиентов в рецепте c through.
+    Ингредиент выбирается поиском, а не списком всего справочника.
     """
     model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
     min_num = 1
     extra = 1
 
@@ -27,25 +31,39 @@ class RecipeIngredientInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline,)
     list_display = ('author', 'name', 'favorite_count')
-    list_filter = ('author', 'name', 'tags')
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name', '^author__username')
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
 
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
 class FavoriteRecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
@@ -1,6 +1,18 @@
+from contextlib import suppress
+
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+from reportlab.pdfbase.ttfonts import TTFError
 
 
 class FoodgramConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodgram'
+
+    def ready(self):
+        from foodgram import signals
+        from foodgram.pdf import register_font
+        post_migrate.connect(signals.create_trigram_index, sender=self)
+        post_migrate.connect(signals.create_search_index, sender=self)
+        with suppress(TTFError):
+            register_font()
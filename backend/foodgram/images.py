@@ -0,0 +1,91 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from api.cache import bump_generation
+from foodgram.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (200, 200),
+    'card': (600, 600),
+    'full': (1600, 1600),
+}
+RENDITIONS_DIR = 'recipes/renditions'
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_WORKERS,
+    thread_name_prefix='renditions',
+)
+
+
+def get_format():
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def render(image, size, image_format):
+    """Уменьшенная копия без метаданных исходного файла."""
+    copy = image.copy()
+    copy.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    copy.save(buffer, image_format, quality=80, optimize=True)
+    return buffer.getvalue()
+
+
+def make_renditions(recipe_id, source):
+    """
+    Сохраняет варианты фото рецепта и записывает их в image_renditions,
+    если фото рецепта не сменилось за время обработки. Уже готовые
+    варианты для того же фото не пересоздаются.
+    """
+    current = Recipe.objects.filter(pk=recipe_id).values_list(
+        'image_renditions', flat=True).first()
+    if current is None or current.get('source') == source:
+        return
+    image_format, extension = get_format()
+    with default_storage.open(source) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image = image.convert('RGB')
+    stem = PurePosixPath(source).stem
+    renditions = {'source': source}
+    for name, size in RENDITIONS.items():
+        renditions[name] = default_storage.save(
+            f'{RENDITIONS_DIR}/{stem}_{name}.{extension}',
+            ContentFile(render(image, size, image_format)),
+        )
+    previous = Recipe.objects.filter(pk=recipe_id).values_list(
+        'image_renditions', flat=True).first()
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_renditions=renditions, updated=timezone.now())
+    if updated:
+        bump_generation('recipes')
+    stale = previous if updated else renditions
+    for name in RENDITIONS:
+        if stale and stale.get(name):
+            default_storage.delete(stale[name])
+
+
+def run(recipe_id, source):
+    try:
+        make_renditions(recipe_id, source)
+    except Exception:
+        logger.exception('Не удалось подготовить фото рецепта %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(recipe):
+    """Обработать фото рецепта в фоне после фиксации транзакции."""
+    source = recipe.image.name
+    transaction.on_commit(lambda: _executor.submit(run, recipe.pk, source))
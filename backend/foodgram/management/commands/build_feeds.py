@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет ленты подписок по существующим подпискам и рецептам. '
+        'Повторный запуск безопасен: имеющиеся строки ленты пропускаются.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            total = FeedItem.objects.backfill()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {total} строк ленты '
+            f'за {time.monotonic() - started:.1f} с'))
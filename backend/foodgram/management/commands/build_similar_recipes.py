@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.models import SimilarRecipe
+from foodgram.search import recipe_index
+from foodgram.similar import recipe_tags, similar_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает списки похожих рецептов для всех рецептов '
+        'по ингредиентам и тегам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        batch_size = options['batch_size']
+        tags = recipe_tags()
+        recipe_ids = recipe_index.recipe_ids()
+        for start in range(0, len(recipe_ids), batch_size):
+            batch = recipe_ids[start:start + batch_size]
+            rows = [
+                SimilarRecipe(recipe_id=recipe_id, similar_id=pk,
+                              score=score)
+                for recipe_id in batch
+                for score, pk in similar_recipes(recipe_id, tags)
+            ]
+            with transaction.atomic():
+                SimilarRecipe.objects.filter(recipe__in=batch).delete()
+                SimilarRecipe.objects.bulk_create(rows, batch_size=5000)
+            self.stdout.write(
+                f'{start + len(batch)} из {len(recipe_ids)} рецептов')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.models import ShoppingListItem
+from foodgram.utils import aggregate_shopping_lists
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет итоги списков покупок с корзинами пользователей '
+        'и при --repair исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Исправить найденные расхождения.',
+        )
+
+    def handle(self, *args, **options):
+        expected = aggregate_shopping_lists()
+        stored = {
+            (user_id, ingredient_id): (pk, amount)
+            for pk, user_id, ingredient_id, amount
+            in ShoppingListItem.objects.values_list(
+                'id', 'user_id', 'ingredient_id', 'amount').iterator()
+        }
+        missing = [key for key in expected if key not in stored]
+        extra = [pk for key, (pk, _) in stored.items() if key not in expected]
+        wrong = [
+            (pk, expected[key]) for key, (pk, amount) in stored.items()
+            if key in expected and expected[key] != amount
+        ]
+        self.stdout.write(
+            f'Отсутствует: {len(missing)}, лишних: {len(extra)}, '
+            f'неверных: {len(wrong)}'
+        )
+        if not options['repair'] or not (missing or extra or wrong):
+            return
+        with transaction.atomic():
+            ShoppingListItem.objects.filter(id__in=extra).delete()
+            items = [ShoppingListItem(id=pk, amount=amount)
+                     for pk, amount in wrong]
+            ShoppingListItem.objects.bulk_update(items, ['amount'],
+                                                 batch_size=1000)
+            ShoppingListItem.objects.bulk_create(
+                (ShoppingListItem(user_id=user_id, ingredient_id=pk,
+                                  amount=expected[user_id, pk])
+                 for user_id, pk in missing),
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS('Расхождения исправлены'))
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from foodgram.models import Cart, Favorite, Recipe
+from foodgram.utils import count_subquery
+from users.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики избранного, списков покупок и рецептов автора '
+        'с данными и при --repair исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair', action='store_true',
+            help='Исправить найденные расхождения.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = self.check_recipes()
+        authors, missing = self.check_authors()
+        self.stdout.write(
+            f'Рецептов с неверными счётчиками: {len(recipes)}, '
+            f'авторов: {len(authors)}, без счётчиков: {len(missing)}'
+        )
+        if not options['repair'] or not (recipes or authors or missing):
+            return
+        Recipe.objects.filter(pk__in=recipes).update(
+            favorites_count=count_subquery(Favorite.objects, 'recipe'),
+            in_carts_count=count_subquery(Cart.objects, 'recipe'),
+        )
+        AuthorStats.objects.bulk_create(
+            (AuthorStats(author_id=pk) for pk in missing),
+            batch_size=1000, ignore_conflicts=True,
+        )
+        AuthorStats.objects.filter(
+            author__in=authors + missing
+        ).update(recipes_count=Coalesce(Subquery(
+            Recipe.objects.filter(author=OuterRef('author')).order_by()
+            .values('author').annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField(),
+        ), Value(0)))
+        self.stdout.write(self.style.SUCCESS('Расхождения исправлены'))
+
+    def check_recipes(self):
+        """Рецепты, счётчики которых расходятся с данными."""
+        return list(Recipe.objects.annotate(
+            actual_favorites=count_subquery(Favorite.objects, 'recipe'),
+            actual_carts=count_subquery(Cart.objects, 'recipe'),
+        ).exclude(
+            favorites_count=F('actual_favorites'),
+            in_carts_count=F('actual_carts'),
+        ).values_list('pk', flat=True))
+
+    def check_authors(self):
+        """
+        Авторы с неверным счётчиком рецептов и авторы рецептов, для
+        которых счётчика ещё нет.
+        """
+        expected = dict(Recipe.objects.order_by().values(
+            'author').annotate(count=Count('pk')).values_list(
+            'author', 'count'))
+        stored = dict(AuthorStats.objects.values_list(
+            'author', 'recipes_count'))
+        wrong = [pk for pk, count in stored.items()
+                 if expected.get(pk, 0) != count]
+        missing = [pk for pk in expected if pk not in stored]
+        return wrong, missing
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.models import Cart, Favorite, Recipe, RecipeScore
+from foodgram.utils import count_subquery
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинги рецептов popular и trending. Запускается '
+        'периодически, чтобы сдвигать окно trending.'
+    )
+
+    def handle(self, *args, **options):
+        since = RecipeScore.objects.trending_since()
+        with transaction.atomic():
+            RecipeScore.objects.bulk_create(
+                (RecipeScore(recipe_id=pk) for pk in Recipe.objects.filter(
+                    score__isnull=True).values_list('id', flat=True)),
+                batch_size=1000, ignore_conflicts=True,
+            )
+            updated = RecipeScore.objects.update(
+                popular=(
+                    count_subquery(Favorite.objects, 'recipe', 'recipe')
+                    + count_subquery(Cart.objects, 'recipe', 'recipe')
+                ),
+                trending=(
+                    count_subquery(Favorite.objects.filter(
+                        created__gte=since), 'recipe', 'recipe')
+                    + count_subquery(Cart.objects.filter(
+                        created__gte=since), 'recipe', 'recipe')
+                ),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны рейтинги {updated} рецептов'))
@@ -1,7 +1,18 @@
+from datetime import timedelta
+from itertools import islice
+
 from colorfield.fields import ColorField
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (Case, Count, Exists, F, OuterRef, Prefetch,
+                              Value, When)
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from users.models import Follow
 
 User = get_user_model()
 
@@ -17,6 +28,10 @@ class Ingredient(models.Model):
         ordering = ['-id']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(fields=['name', 'measurement_unit'],
+                         name='ingredient_name_unit_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -39,6 +54,62 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Кверисет рецептов с подготовкой к выдаче через API."""
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует флаги is_favorited, is_in_shopping_cart и
+        author_is_subscribed для пользователя через подзапросы Exists.
+        """
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=models.BooleanField()),
+                author_is_subscribed=Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def for_read(self, user):
+        """
+        Рецепты со всеми связанными данными для сериализации: число
+        запросов на страницу не зависит от её размера.
+        """
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'),
+            ),
+        ).with_user_flags(user)
+
+    def feed_sources(self, user):
+        """
+        Источники ленты подписок пользователя, каждый — отдельный
+        индексный просмотр по убыванию id: рецепты из его FeedItem по
+        индексу unique_feed_item (user, recipe) и рецепты подписанных
+        авторов с лентой при чтении по индексу (author, -id). Сливает
+        их MergedCursorPagination.
+        """
+        sources = [self.filter(feed_items__user=user)]
+        pull_authors = list(PullFeedAuthor.objects.filter(
+            author__in=Follow.objects.filter(user=user).values('author')
+        ).order_by().values_list('author', flat=True))
+        if pull_authors:
+            sources.append(self.filter(author__in=pull_authors))
+        return sources
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -47,6 +118,9 @@ class Recipe(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название рецепта')
     image = models.ImageField(upload_to='recipes/',
                               verbose_name='Фото рецепта')
+    image_renditions = models.JSONField(default=dict, blank=True,
+                                        editable=False,
+                                        verbose_name='Варианты фото')
     text = models.TextField(verbose_name='Описание рецепта')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -59,15 +133,50 @@ class Recipe(models.Model):
             validators.MinValueValidator(
                 1, message='Минимальное время приготовления 1 минута'),),
         verbose_name='Время приготовления')
+    created = models.DateTimeField(default=timezone.now, editable=False,
+                                   db_index=True,
+                                   verbose_name='Дата создания')
+    updated = models.DateTimeField(auto_now=True, db_index=True,
+                                   verbose_name='Дата изменения')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В списках покупок')
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    computed_fields = ('favorites_count', 'in_carts_count', 'search_vector',
+                       'image_renditions')
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx'),
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Счётчики, поисковый вектор и варианты фото меняются только
+        выражениями в UPDATE, поэтому при сохранении существующего рецепта
+        не перезаписываются.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.computed_fields
+            ]
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     """Модель количества ингредиентов в каком либо рецепте."""
@@ -117,6 +226,9 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(default=timezone.now, db_index=True,
+                                   editable=False,
+                                   verbose_name='Дата добавления')
 
     class Meta:
         ordering = ['-id']
@@ -142,6 +254,9 @@ class Cart(models.Model):
         related_name='cart',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(default=timezone.now, db_index=True,
+                                   editable=False,
+                                   verbose_name='Дата добавления')
 
     class Meta:
         ordering = ['-id']
@@ -154,3 +269,349 @@ class Cart(models.Model):
 
     def __str__(self):
         return f'рецепт {self.recipe} в списке покупок {self.user}'
+
+
+class ShoppingListItemManager(models.Manager):
+    """Инкрементальное обновление итогов списков покупок."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+        Изменить количество ингредиентов deltas ({id: изменение})
+        в списках покупок пользователей user_ids.
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        with transaction.atomic():
+            # Недостающие строки вставляются с нулём без ошибки при
+            # конкурентной вставке, затем все строки меняются одним UPDATE.
+            self.bulk_create(
+                (ShoppingListItem(user_id=user_id, ingredient_id=pk,
+                                  amount=0)
+                 for user_id in user_ids
+                 for pk, delta in deltas.items() if delta > 0),
+                ignore_conflicts=True,
+            )
+            items = self.filter(user_id__in=user_ids,
+                                ingredient_id__in=deltas)
+            list(items.select_for_update().order_by('id').values_list(
+                'id', flat=True))
+            items.update(amount=F('amount') + Case(
+                *(When(ingredient_id=pk, then=Value(delta))
+                  for pk, delta in deltas.items()),
+                output_field=models.IntegerField(),
+            ))
+            items.filter(amount__lte=0).delete()
+
+    @staticmethod
+    def recipe_amounts(recipe):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount'))
+
+    def add_recipe(self, user_id, recipe):
+        self.apply_deltas([user_id], self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user_id, recipe):
+        self.apply_deltas([user_id], {
+            pk: -amount
+            for pk, amount in self.recipe_amounts(recipe).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Учесть изменение ингредиентов рецепта во всех корзинах с ним."""
+        deltas = {
+            pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+            for pk in old_amounts.keys() | new_amounts.keys()
+        }
+        self.apply_deltas(
+            Cart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True),
+            deltas,
+        )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Итоговое количество ингредиента в списке покупок пользователя.
+    Поддерживается при изменении корзины и рецептов в ней.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок {self.user}'
+
+
+class FeedItemManager(models.Manager):
+    """
+    Ленты подписок с рассылкой при записи: новый рецепт сразу попадает
+    в ленты подписчиков автора. Авторы, у которых подписчиков не меньше
+    FEED_PULL_THRESHOLD, переводятся на сборку ленты при чтении.
+    """
+    batch_size = 1000
+
+    def is_pull_author(self, author):
+        return PullFeedAuthor.objects.filter(author=author).exists()
+
+    def fan_out(self, recipe):
+        """Добавить рецепт в ленты подписчиков автора."""
+        self.fan_out_many([recipe])
+
+    def fan_out_many(self, recipes):
+        """
+        Добавить рецепты в ленты подписчиков их авторов одной пачкой,
+        например после загрузки bulk_create.
+        """
+        authors = {recipe.author_id for recipe in recipes}
+        authors -= set(PullFeedAuthor.objects.filter(
+            author__in=authors).values_list('author', flat=True))
+        followers = {}
+        for author_id, user_id in Follow.objects.filter(
+                author__in=authors).order_by().values_list(
+                'author_id', 'user_id').iterator():
+            followers.setdefault(author_id, []).append(user_id)
+        self.bulk_create(
+            (self.model(user_id=user_id, recipe_id=recipe.id,
+                        author_id=recipe.author_id)
+             for recipe in recipes
+             for user_id in followers.get(recipe.author_id, ())),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def backfill(self):
+        """
+        Заполнить ленты по существующим подпискам: авторы с числом
+        подписчиков не меньше FEED_PULL_THRESHOLD переводятся на сборку
+        ленты при чтении, рецепты остальных рассылаются подписчикам.
+        Возвращает число обработанных строк ленты.
+        """
+        popular = Follow.objects.order_by().values('author').annotate(
+            followers=Count('pk'),
+        ).filter(followers__gte=settings.FEED_PULL_THRESHOLD)
+        PullFeedAuthor.objects.bulk_create(
+            (PullFeedAuthor(author_id=author_id)
+             for author_id in popular.values_list('author', flat=True)),
+            ignore_conflicts=True,
+        )
+        pull_authors = PullFeedAuthor.objects.values('author')
+        self.filter(author__in=pull_authors).delete()
+        rows = Follow.objects.exclude(author__in=pull_authors).filter(
+            author__recipes__isnull=False,
+        ).order_by().values_list(
+            'user_id', 'author__recipes', 'author_id').iterator()
+        total = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return total
+            self.bulk_create(
+                (self.model(user_id=user_id, recipe_id=recipe_id,
+                            author_id=author_id)
+                 for user_id, recipe_id, author_id in batch),
+                ignore_conflicts=True,
+            )
+            total += len(batch)
+
+    @transaction.atomic
+    def follow(self, user, author):
+        """
+        Заполнить ленту рецептами автора после подписки или перевести
+        автора на сборку ленты при чтении.
+        """
+        if self.is_pull_author(author):
+            return
+        followers = Follow.objects.filter(author=author).count()
+        if followers >= settings.FEED_PULL_THRESHOLD:
+            PullFeedAuthor.objects.get_or_create(author=author)
+            self.filter(author=author).delete()
+            return
+        recipes = Recipe.objects.filter(author=author).values_list(
+            'id', flat=True)
+        self.bulk_create(
+            (self.model(user=user, recipe_id=recipe_id, author=author)
+             for recipe_id in recipes.iterator()),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def unfollow(self, user, author):
+        """Убрать рецепты автора из ленты после отписки."""
+        self.filter(user=user, author=author).delete()
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+
+    objects = FeedItemManager()
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_feed_item')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='feed_item_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class PullFeedAuthor(models.Model):
+    """
+    Автор с большим числом подписчиков: его рецепты не рассылаются
+    по лентам, а добавляются в ленту при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='pull_feed',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Автор с лентой при чтении'
+        verbose_name_plural = 'Авторы с лентой при чтении'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class SimilarRecipe(models.Model):
+    """
+    Рецепт, похожий на данный по ингредиентам и тегам. Списки считаются
+    заранее командой build_similar_recipes и обновляются после изменения
+    рецептов.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'similar'],
+                                    name='unique_similar_recipe')
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='similar_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+
+class RecipeScoreManager(models.Manager):
+
+    def trending_since(self):
+        """Начало окна, за которое считается рейтинг trending."""
+        return timezone.now() - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+
+    def change(self, recipe_id, delta, recent=True):
+        """
+        Изменить рейтинги рецепта на delta после добавления или удаления
+        из избранного или списка покупок. recent — отметка попадает в
+        окно trending. Рейтинги не опускаются ниже нуля, а для удаления
+        запись не создаётся: рецепт может удаляться каскадом.
+        """
+        values = {'popular': Greatest(F('popular') + delta, 0)}
+        if recent:
+            values['trending'] = Greatest(F('trending') + delta, 0)
+        if self.filter(recipe=recipe_id).update(**values) or delta < 0:
+            return
+        self.get_or_create(recipe_id=recipe_id)
+        self.filter(recipe=recipe_id).update(**values)
+
+
+class RecipeScore(models.Model):
+    """
+    Рейтинги рецепта для сортировки выдачи: popular — все добавления в
+    избранное и списки покупок, trending — добавления за последние
+    TRENDING_WINDOW_DAYS дней. Меняются при добавлении и удалении и
+    пересчитываются командой update_recipe_scores.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='score',
+        verbose_name='Рецепт',
+    )
+    popular = models.IntegerField(default=0, verbose_name='Популярность')
+    trending = models.IntegerField(default=0,
+                                   verbose_name='Популярность за период')
+
+    objects = RecipeScoreManager()
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(fields=['-popular', '-recipe'],
+                         name='recipe_score_popular_idx'),
+            models.Index(fields=['-trending', '-recipe'],
+                         name='recipe_score_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'Рейтинг {self.recipe}'
@@ -0,0 +1,40 @@
+from io import BytesIO
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+FONT_NAME = 'DejaVuSerif'
+FONT_FILE = 'DejaVuSerif.ttf'
+
+
+def register_font():
+    """Регистрирует шрифт для PDF один раз на процесс."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE, 'UTF-8'))
+
+
+def render_shopping_list(rows):
+    """
+    PDF списка покупок из строк (название, единица, количество).
+    Не использует Django, поэтому выполняется в пуле процессов.
+    """
+    register_font()
+    buffer = BytesIO()
+    page = Canvas(filename=buffer)
+    page.setFont(FONT_NAME, 24)
+    page.drawString(210, 800, 'Список покупок')
+    page.setFont(FONT_NAME, 16)
+    height = 760
+    is_page_done = False
+    for idx, (name, unit, amount) in enumerate(rows, start=1):
+        is_page_done = False
+        page.drawString(60, height, text=f'{idx}. {name} - {amount} {unit}')
+        height -= 30
+        if height <= 40:
+            page.showPage()
+            is_page_done = True
+    if not is_page_done:
+        page.showPage()
+    page.save()
+    return buffer.getvalue()
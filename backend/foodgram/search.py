@@ -0,0 +1,348 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connection, connections
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from api.cache import get_generation
+from foodgram.models import Ingredient, Recipe, RecipeIngredient
+
+INGREDIENT_SEARCH_LIMIT = 50
+SIMILARITY_THRESHOLD = 0.3
+
+SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+)
+RECIPE_FTS_TABLE = 'foodgram_recipe_fts'
+
+COOK_MIN_COVERAGE = 0.5
+COOK_LIMIT = 20
+RECIPE_INDEX_SYNC_OVERLAP = timedelta(minutes=1)
+
+WORD = re.compile(r'\w+')
+WORD_START = re.compile(r'\b\w')
+
+
+def normalize(value):
+    return value.strip().lower()
+
+
+def trigrams(value):
+    """Множество триграмм строки, как их считает pg_trgm."""
+    result = set()
+    for word in WORD.findall(value.lower()):
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения по названию.
+
+    Строится при первом поиске и перестраивается при смене поколения
+    ingredients, которое меняют сигналы сохранения и удаления ингредиента,
+    так что поиск не обращается к БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def build(self):
+        items = {}
+        names = []
+        words = []
+        grams = {}
+        sizes = {}
+        for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').order_by():
+            items[pk] = {'id': pk, 'name': name, 'measurement_unit': unit}
+            key = normalize(name)
+            names.append((key, pk))
+            words.extend(
+                (key[match.start():], pk)
+                for match in WORD_START.finditer(key) if match.start()
+            )
+            name_grams = trigrams(key)
+            sizes[pk] = len(name_grams)
+            for gram in name_grams:
+                grams.setdefault(gram, []).append(pk)
+        names.sort()
+        words.sort()
+        return items, names, words, grams, sizes
+
+    def get_data(self):
+        current = get_generation('ingredients')
+        generation, data = self._data or (None, None)
+        if generation != current:
+            with self._lock:
+                generation, data = self._data or (None, None)
+                if generation != current:
+                    data = self.build()
+                    self._data = current, data
+        return data
+
+    @staticmethod
+    def prefixed(keys, prefix):
+        """Записи отсортированного списка, начинающиеся с prefix."""
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            yield keys[position]
+            position += 1
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        """
+        Ингредиенты по запросу: сначала точное совпадение, затем
+        совпадение с началом названия, затем с началом любого слова.
+        """
+        items, names, words, _, _ = self.get_data()
+        query = normalize(query)
+        exact, prefix, found = [], [], set()
+        for key, pk in self.prefixed(names, query):
+            if len(exact) + len(prefix) >= limit:
+                break
+            found.add(pk)
+            if key == query:
+                exact.append(pk)
+            else:
+                prefix.append(pk)
+        result = exact + prefix
+        for _, pk in self.prefixed(words, query):
+            if len(result) >= limit:
+                break
+            if pk not in found:
+                found.add(pk)
+                result.append(pk)
+        return [items[pk] for pk in result]
+
+    def fuzzy_search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        """
+        Нечёткий поиск по триграммам: ингредиенты со сходством не ниже
+        SIMILARITY_THRESHOLD, по убыванию сходства.
+        """
+        items, _, _, grams, sizes = self.get_data()
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(grams.get(gram, ()))
+        scored = []
+        for pk, count in shared.items():
+            similarity = count / (len(query_grams) + sizes[pk] - count)
+            if similarity >= SIMILARITY_THRESHOLD:
+                scored.append((-similarity, items[pk]['name'], pk))
+        scored.sort()
+        return [items[pk] for _, _, pk in scored[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс ингредиент -> отсортированный список рецептов в памяти
+    процесса для подбора рецептов по имеющимся ингредиентам.
+
+    При смене поколения recipes индекс догружает рецепты, изменённые с
+    прошлой синхронизации по Recipe.updated (с запасом на долгие
+    транзакции), и перестраивается целиком при смене поколения
+    recipes_deleted, которое меняет удаление рецепта.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._deleted_generation = None
+        self._synced_at = None
+        self.postings = {}
+        self.recipes = {}
+
+    def build(self):
+        synced_at = timezone.now()
+        recipes = {pk: [] for pk in Recipe.objects.values_list(
+            'id', flat=True).order_by().iterator()}
+        postings = {}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+                'recipe_id').values_list(
+                'recipe_id', 'ingredient_id').iterator():
+            if recipe_id in recipes:
+                recipes[recipe_id].append(ingredient_id)
+                postings.setdefault(ingredient_id, []).append(recipe_id)
+        self.recipes = {pk: tuple(sorted(ingredients))
+                        for pk, ingredients in recipes.items()}
+        self.postings = postings
+        self._synced_at = synced_at
+
+    def replace(self, recipe_id, ingredients):
+        """Заменить ингредиенты рецепта в индексе."""
+        old = set(self.recipes.get(recipe_id, ()))
+        new = set(ingredients)
+        for ingredient_id in old - new:
+            posting = self.postings[ingredient_id]
+            del posting[bisect_left(posting, recipe_id)]
+        for ingredient_id in new - old:
+            insort(self.postings.setdefault(ingredient_id, []), recipe_id)
+        self.recipes[recipe_id] = tuple(sorted(new))
+
+    def sync(self):
+        synced_at = timezone.now()
+        changed = {pk: [] for pk in Recipe.objects.filter(
+            updated__gte=self._synced_at - RECIPE_INDEX_SYNC_OVERLAP
+        ).values_list('id', flat=True)}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe__in=list(changed)).values_list(
+                'recipe_id', 'ingredient_id'):
+            changed[recipe_id].append(ingredient_id)
+        for recipe_id, ingredients in changed.items():
+            self.replace(recipe_id, ingredients)
+        self._synced_at = synced_at
+
+    def refresh(self):
+        deleted = get_generation('recipes_deleted')
+        current = get_generation('recipes')
+        if (self._generation, self._deleted_generation) == (current,
+                                                            deleted):
+            return
+        if self._synced_at is None or self._deleted_generation != deleted:
+            self.build()
+        else:
+            self.sync()
+        self._generation, self._deleted_generation = current, deleted
+
+    def neighbours(self, recipe_id, max_posting):
+        """
+        Ингредиенты рецепта и ингредиенты рецептов, у которых с ним есть
+        общий ингредиент, встречающийся не более чем в max_posting
+        рецептах: слишком частые ингредиенты кандидатов не дают.
+        """
+        with self._lock:
+            self.refresh()
+            ingredients = self.recipes.get(recipe_id, ())
+            candidates = set()
+            for ingredient_id in ingredients:
+                posting = self.postings[ingredient_id]
+                if len(posting) <= max_posting:
+                    candidates.update(posting)
+            candidates.discard(recipe_id)
+            return ingredients, {
+                pk: self.recipes[pk] for pk in candidates}
+
+    def recipe_ids(self):
+        with self._lock:
+            self.refresh()
+            return sorted(self.recipes)
+
+    def cook(self, pantry, min_coverage=COOK_MIN_COVERAGE,
+             limit=COOK_LIMIT):
+        """
+        Рецепты, ингредиенты которых покрыты набором pantry не меньше чем
+        на min_coverage: список (id, покрытие, число недостающих) по
+        убыванию покрытия.
+        """
+        with self._lock:
+            self.refresh()
+            covered = Counter()
+            for ingredient_id in set(pantry):
+                covered.update(self.postings.get(ingredient_id, ()))
+            scored = []
+            for recipe_id, count in covered.items():
+                total = len(self.recipes[recipe_id])
+                if count / total >= min_coverage:
+                    scored.append((-count / total, total - count, -recipe_id))
+        return [(-recipe_id, -coverage, missing) for coverage, missing,
+                recipe_id in heapq.nsmallest(limit, scored)]
+
+
+recipe_index = RecipeIngredientIndex()
+
+
+def fuzzy_search_ingredients(query, limit=INGREDIENT_SEARCH_LIMIT):
+    """
+    Нечёткий поиск ингредиентов. В PostgreSQL использует pg_trgm и
+    GIN-индекс по названию, в остальных СУБД индекс в памяти процесса.
+    """
+    if connection.vendor != 'postgresql':
+        return ingredient_index.fuzzy_search(query, limit)
+    return list(Ingredient.objects.filter(
+        name__trigram_similar=query
+    ).annotate(
+        similarity=TrigramSimilarity('name', query)
+    ).order_by('-similarity', 'name').values(
+        'id', 'name', 'measurement_unit'
+    )[:limit])
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию, по убыванию
+    релевантности. В PostgreSQL использует столбец search_vector с
+    GIN-индексом, в SQLite таблицу FTS5.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-rank', '-id')
+    match = ' '.join(
+        '"{}"*'.format(word) for word in WORD.findall(query.lower()))
+    if not match:
+        return queryset.none()
+    return queryset.annotate(rank=RawSQL(
+        f'SELECT -bm25({RECIPE_FTS_TABLE}) FROM {RECIPE_FTS_TABLE} '
+        f'WHERE {RECIPE_FTS_TABLE} MATCH %s '
+        f'AND rowid = {Recipe._meta.db_table}.id',
+        (match,),
+        output_field=FloatField(),
+    )).filter(rank__isnull=False).order_by('-rank', '-id')
+
+
+def index_recipe(recipe):
+    """Обновить поисковый индекс рецепта после сохранения."""
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk=recipe.pk).update(
+            search_vector=RECIPE_SEARCH_VECTOR)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {RECIPE_FTS_TABLE} '
+                '(rowid, name, text) VALUES (%s, %s, %s)',
+                (recipe.pk, recipe.name, recipe.text),
+            )
+
+
+def unindex_recipe(recipe_id):
+    """Убрать удалённый рецепт из таблицы FTS5."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {RECIPE_FTS_TABLE} WHERE rowid = %s',
+                (recipe_id,),
+            )
+
+
+def index_missing_recipes(using='default'):
+    """
+    Проиндексировать рецепты, созданные в обход сигналов сохранения,
+    например массовой загрузкой.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        Recipe.objects.using(using).filter(search_vector=None).update(
+            search_vector=RECIPE_SEARCH_VECTOR)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {RECIPE_FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM {Recipe._meta.db_table} '
+                f'WHERE id NOT IN (SELECT rowid FROM {RECIPE_FTS_TABLE})'
+            )
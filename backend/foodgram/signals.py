@@ -0,0 +1,200 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.cache import bump_generation
+from foodgram.images import schedule_renditions
+from foodgram.models import (Cart, Favorite, FeedItem, Ingredient, Recipe,
+                             RecipeIngredient, RecipeScore, ShoppingListItem,
+                             Tag)
+from foodgram.search import (RECIPE_FTS_TABLE, index_missing_recipes,
+                             index_recipe, unindex_recipe)
+from foodgram.similar import schedule_similar
+
+User = get_user_model()
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    Cart: 'in_carts_count',
+}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(instance, **kwargs):
+    bump_generation('ingredients')
+    bump_generation('recipes')
+    touch_recipes(recipe_ingredient__ingredient=instance.pk)
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def tags_changed(instance, **kwargs):
+    bump_generation('tags')
+    bump_generation('recipes')
+    touch_recipes(tags=instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(**kwargs):
+    bump_generation('recipes')
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    bump_generation('recipes')
+    touch_recipes(pk=instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    bump_generation('recipes')
+    if not reverse:
+        touch_recipes(pk=instance.pk)
+    elif pk_set:
+        touch_recipes(pk__in=pk_set)
+    else:
+        touch_recipes(tags=instance.pk)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_generation('recipes')
+    touch_recipes(author=instance.pk)
+
+
+def touch_recipes(**lookups):
+    """Обновить дату изменения рецептов, выдача которых изменилась."""
+    Recipe.objects.filter(**lookups).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created=False, raw=False, update_fields=None,
+                 **kwargs):
+    if not update_fields or {'name', 'text'} & set(update_fields):
+        index_recipe(instance)
+    if raw:
+        return
+    if created:
+        RecipeScore.objects.get_or_create(recipe=instance)
+        FeedItem.objects.fan_out(instance)
+    schedule_similar(instance)
+    if not instance.image:
+        return
+    if instance.image_renditions.get('source') != instance.image.name:
+        schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    bump_generation('recipes_deleted')
+    unindex_recipe(instance.pk)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+def recipe_mark_added(sender, instance, created=False, **kwargs):
+    if created:
+        change_counters(sender, instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+def recipe_mark_removed(sender, instance, **kwargs):
+    recent = instance.created >= RecipeScore.objects.trending_since()
+    change_counters(sender, instance.recipe_id, -1, recent)
+
+
+def change_counters(model, recipe_id, delta, recent=True):
+    """
+    Обновить счётчик рецепта и его рейтинги при любом добавлении или
+    удалении из избранного или списка покупок, в том числе из админки и
+    каскадом. Счётчик не опускается ниже нуля, даже если разошёлся с
+    данными.
+    """
+    counter = RECIPE_COUNTERS[model]
+    Recipe.objects.filter(pk=recipe_id).update(
+        **{counter: Greatest(F(counter) + delta, 0)})
+    RecipeScore.objects.change(recipe_id, delta, recent)
+
+
+@receiver(post_save, sender=Cart)
+def cart_added(instance, created=False, **kwargs):
+    """
+    Итоги списков покупок следуют за корзинами и строками ингредиентов,
+    в том числе из админки и при каскадном удалении рецепта: корзина
+    снимает текущие ингредиенты рецепта, строка ингредиента — себя из
+    оставшихся корзин, поэтому результат не зависит от порядка удаления.
+    """
+    if created:
+        ShoppingListItem.objects.add_recipe(instance.user_id,
+                                            instance.recipe_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_removed(instance, **kwargs):
+    ShoppingListItem.objects.remove_recipe(instance.user_id,
+                                           instance.recipe_id)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(instance, **kwargs):
+    instance.saved_amounts = dict(RecipeIngredient.objects.filter(
+        pk=instance.pk).values_list('ingredient_id', 'amount'))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, **kwargs):
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id, instance.saved_amounts,
+        {instance.ingredient_id: instance.amount})
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, **kwargs):
+    ShoppingListItem.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}, {})
+
+
+def create_search_index(using, **kwargs):
+    """
+    Индекс полнотекстового поиска рецептов: GIN-индекс по search_vector
+    в PostgreSQL или таблица FTS5 в SQLite. Подключается к post_migrate
+    приложения foodgram и индексирует рецепты без поискового индекса.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS foodgram_recipe_search_vector '
+                'ON foodgram_recipe USING gin (search_vector)'
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {RECIPE_FTS_TABLE} '
+                'USING fts5(name, text)'
+            )
+    index_missing_recipes(using)
+
+
+def create_trigram_index(using, **kwargs):
+    """
+    Расширение pg_trgm и GIN-индекс для нечёткого поиска ингредиентов.
+    Подключается к post_migrate приложения foodgram.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS foodgram_ingredient_name_trgm '
+            'ON foodgram_ingredient USING gin (name gin_trgm_ops)'
+        )
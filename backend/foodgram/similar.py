@@ -0,0 +1,103 @@
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+
+from foodgram.models import Recipe, SimilarRecipe
+from foodgram.search import recipe_index
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_LIMIT = 10
+SIMILAR_MAX_POSTING = 5000
+SIMILAR_REFRESH_LIMIT = 50
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similar')
+
+
+def recipe_tags(recipe_ids=None):
+    """Теги рецептов recipe_ids или всех рецептов: id рецепта -> id тегов."""
+    links = Recipe.tags.through.objects.order_by()
+    if recipe_ids is not None:
+        links = links.filter(recipe__in=recipe_ids)
+    tags = {}
+    for recipe_id, tag_id in links.values_list(
+            'recipe_id', 'tag_id').iterator():
+        tags.setdefault(recipe_id, set()).add(tag_id)
+    return tags
+
+
+def features(ingredients, tags):
+    """Признаки рецепта: id ингредиентов и id тегов со знаком минус."""
+    return {*ingredients, *(-tag_id for tag_id in tags)}
+
+
+def similar_recipes(recipe_id, tags=None, limit=SIMILAR_LIMIT):
+    """
+    Не более limit рецептов, похожих на recipe_id, по коэффициенту
+    Жаккара на множествах ингредиентов и тегов: список (сходство, id)
+    по убыванию сходства. Кандидаты берутся из обратного индекса
+    ингредиентов, теги при необходимости загружаются только для них.
+    """
+    ingredients, candidates = recipe_index.neighbours(
+        recipe_id, SIMILAR_MAX_POSTING)
+    if tags is None:
+        tags = recipe_tags([recipe_id, *candidates])
+    own = features(ingredients, tags.get(recipe_id, ()))
+    scored = []
+    for pk, candidate_ingredients in candidates.items():
+        other = features(candidate_ingredients, tags.get(pk, ()))
+        common = len(own & other)
+        scored.append((common / (len(own) + len(other) - common), pk))
+    return heapq.nlargest(limit, scored)
+
+
+def store(recipe_id, scored):
+    """Заменить сохранённый список похожих рецептов."""
+    SimilarRecipe.objects.filter(recipe=recipe_id).delete()
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=recipe_id, similar_id=pk, score=score)
+        for score, pk in scored
+    )
+
+
+def refresh_similar(recipe_id):
+    """
+    Пересчитать похожие рецепты для изменённого рецепта, его новых
+    соседей и рецептов, в списках которых он был.
+    """
+    scored = similar_recipes(recipe_id)
+    affected = {pk for _, pk in scored}
+    affected.update(SimilarRecipe.objects.filter(
+        similar=recipe_id).values_list('recipe_id', flat=True))
+    affected.discard(recipe_id)
+    lists = {pk: similar_recipes(pk)
+             for pk in sorted(affected)[:SIMILAR_REFRESH_LIMIT]}
+    lists[recipe_id] = scored
+    ids = set(lists).union(
+        pk for pk_scored in lists.values() for _, pk in pk_scored)
+    with transaction.atomic():
+        # Рецепт мог быть удалён, пока списки считались.
+        existing = set(Recipe.objects.filter(pk__in=ids).values_list(
+            'id', flat=True))
+        for pk, pk_scored in lists.items():
+            if pk in existing:
+                store(pk, [(score, similar) for score, similar in pk_scored
+                           if similar in existing])
+
+
+def run(recipe_id):
+    try:
+        refresh_similar(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обновить похожие рецепты для %s', recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_similar(recipe):
+    """Обновить похожие рецепты в фоне после фиксации транзакции."""
+    recipe_id = recipe.pk
+    transaction.on_commit(lambda: _executor.submit(run, recipe_id))
@@ -1,42 +1,181 @@
-from django.db.models import Sum
-from django.http import HttpResponse
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen.canvas import Canvas
+import csv
+import json
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
 
-from foodgram.models import RecipeIngredient
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (Count, IntegerField, OuterRef, Subquery, Sum,
+                              Value)
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
 
+from foodgram.models import RecipeIngredient, ShoppingListItem
+from foodgram.pdf import render_shopping_list
 
-def generate_pdf_shopping_list(user):
-    shopping_list = RecipeIngredient.objects.filter(
-        recipe__cart__user=user).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-    ).annotate(amount=Sum('amount')).order_by()
-    response = HttpResponse(content_type='application/pdf')
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+PDF_CACHE_KEY = 'shopping-list-pdf:{}'
+
+_lock = threading.Lock()
+_executors = {}
+_renders = {}
+
+
+def count_subquery(queryset, field, outer='pk'):
+    """
+    Число строк queryset, у которых field равно полю outer внешней записи.
+    """
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+            field).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def get_shopping_list(user):
+    """Суммарное количество каждого ингредиента из корзины пользователя."""
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).order_by('ingredient__name')
+
+
+def aggregate_shopping_lists():
+    """
+    Итоги списков покупок, посчитанные по корзинам заново:
+    {(user_id, ingredient_id): amount}.
+    """
+    return {
+        (row['recipe__cart__user'], row['ingredient']): row['amount']
+        for row in RecipeIngredient.objects.filter(
+            recipe__cart__isnull=False
+        ).values(
+            'recipe__cart__user', 'ingredient'
+        ).annotate(amount=Sum('amount')).order_by().iterator()
+    }
+
+
+def attachment(response, extension):
     response['Content-Disposition'] = (
-        'attachment; filename="shopping_list.pdf"'
+        f'attachment; filename="shopping_list.{extension}"'
     )
-    pdfmetrics.registerFont(
-        TTFont('DejaVuSerif', 'DejaVuSerif.ttf', 'UTF-8')
-    )
-    page = Canvas(filename=response)
-    page.setFont('DejaVuSerif', 24)
-    page.drawString(210, 800, 'Список покупок')
-    page.setFont('DejaVuSerif', 16)
-    height = 760
-    is_page_done = False
-    for idx, ingr in enumerate(shopping_list, start=1):
-        is_page_done = False
-        page.drawString(60, height, text=(
-            f'{idx}. {ingr["ingredient__name"]} - {ingr["amount"]} '
-            f'{ingr["ingredient__measurement_unit"]}'
-        ))
-        height -= 30
-        if height <= 40:
-            page.showPage()
-            is_page_done = True
-    if not is_page_done:
-        page.showPage()
-    page.save()
     return response
+
+
+def get_executor():
+    """
+    Пул процессов для рендера PDF. Процессы запускаются через forkserver,
+    а не fork: форк многопоточного рабочего процесса (фоновые пулы,
+    соединение с БД) может унаследовать захваченные блокировки.
+    """
+    with _lock:
+        if 'pdf' not in _executors:
+            _executors['pdf'] = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('forkserver'),
+            )
+        return _executors['pdf']
+
+
+def render_pdf(rows):
+    """Рендер PDF в пуле процессов, вне рабочего процесса сервера."""
+    try:
+        return get_executor().submit(render_shopping_list, rows).result()
+    except BrokenProcessPool:
+        with _lock:
+            _executors.pop('pdf', None)
+        return render_shopping_list(rows)
+
+
+def render_pdf_cached(rows):
+    """
+    PDF списка покупок из кеша по хешу строк. Одновременные запросы
+    с одинаковыми строками ждут один рендер.
+    """
+    digest = sha256(json.dumps(rows, ensure_ascii=False).encode())
+    cache_key = PDF_CACHE_KEY.format(digest.hexdigest())
+    content = cache.get(cache_key)
+    if content is not None:
+        return content
+    with _lock:
+        future = _renders.get(cache_key)
+        is_owner = future is None
+        if is_owner:
+            future = _renders[cache_key] = Future()
+    if not is_owner:
+        return future.result()
+    try:
+        content = render_pdf(rows)
+    except Exception as error:
+        future.set_exception(error)
+        raise
+    else:
+        cache.set(cache_key, content, settings.PDF_CACHE_TIMEOUT)
+        future.set_result(content)
+    finally:
+        with _lock:
+            del _renders[cache_key]
+    return content
+
+
+def generate_pdf_shopping_list(user):
+    rows = [
+        (ingr['ingredient__name'], ingr['ingredient__measurement_unit'],
+         ingr['amount'])
+        for ingr in get_shopping_list(user)
+    ]
+    return attachment(HttpResponse(
+        render_pdf_cached(rows), content_type='application/pdf'
+    ), 'pdf')
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_rows(shopping_list):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for ingr in shopping_list.iterator():
+        yield writer.writerow((
+            ingr['ingredient__name'],
+            ingr['ingredient__measurement_unit'],
+            ingr['amount'],
+        ))
+
+
+def iter_txt_rows(shopping_list):
+    yield 'Список покупок\n\n'
+    for idx, ingr in enumerate(shopping_list.iterator(), start=1):
+        yield (
+            f'{idx}. {ingr["ingredient__name"]} - {ingr["amount"]} '
+            f'{ingr["ingredient__measurement_unit"]}\n'
+        )
+
+
+def generate_csv_shopping_list(user):
+    return attachment(StreamingHttpResponse(
+        iter_csv_rows(get_shopping_list(user)),
+        content_type='text/csv; charset=utf-8',
+    ), 'csv')
+
+
+def generate_txt_shopping_list(user):
+    return attachment(StreamingHttpResponse(
+        iter_txt_rows(get_shopping_list(user)),
+        content_type='text/plain; charset=utf-8',
+    ), 'txt')
+
+
+SHOPPING_LIST_GENERATORS = {
+    'pdf': generate_pdf_shopping_list,
+    'csv': generate_csv_shopping_list,
+    'txt': generate_txt_shopping_list,
+}
@@ -1,47 +1,136 @@
-from django.shortcuts import get_object_or_404
+from calendar import timegm
+from hashlib import sha1
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.fields import BooleanField
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from api.filters import AuthorAndTagFilter, IngredientSearchFilter
-from api.pagination import LimitPageNumberPagination
+from api.cache import AnonymousListCacheMixin, CachedListMixin
+from api.filters import AuthorAndTagFilter
+from api.pagination import LimitPageNumberPagination, MergedCursorPagination
+from api.parsers import LimitedMultiPartParser
 from api.permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
-from api.serializers import (CropRecipeSerializer, IngredientSerializer,
-                             RecipeSerializer, TagSerializer)
+from api.renderers import (CSVRenderer, FileContentNegotiation, PDFRenderer,
+                           PlainTextRenderer)
+from api.serializers import (CookQuerySerializer, CropRecipeSerializer,
+                             IngredientSerializer, RecipeSerializer,
+                             TagSerializer)
 from foodgram.models import Cart, Favorite, Ingredient, Recipe, Tag
-from foodgram.utils import generate_pdf_shopping_list
+from foodgram.search import (fuzzy_search_ingredients, ingredient_index,
+                             recipe_index)
+from foodgram.utils import SHOPPING_LIST_GENERATORS
+from users.models import AuthorStats
 
 
-class TagsViewSet(ReadOnlyModelViewSet):
+class TagsViewSet(CachedListMixin, ReadOnlyModelViewSet):
     """Вьюсет модели Тег."""
+    cache_name = 'tags'
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(CachedListMixin, ReadOnlyModelViewSet):
     """Вьюсет модели Ингредиент."""
+    cache_name = 'ingredients'
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        fuzzy = request.query_params.get('fuzzy') in BooleanField.TRUE_VALUES
+        if name and fuzzy:
+            return Response(fuzzy_search_ingredients(name))
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousListCacheMixin, viewsets.ModelViewSet):
     """Вьюсет модели Рецепт."""
+    cache_name = 'recipes'
+    cache_ignored_params = ('is_favorited', 'is_in_shopping_cart')
+    cache_skipped_params = ('ordering',)
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     pagination_class = LimitPageNumberPagination
     filter_backends = (DjangoFilterBackend,)
     filter_class = AuthorAndTagFilter
     permission_classes = [IsOwnerOrReadOnly]
+    parser_classes = (JSONParser, LimitedMultiPartParser)
+
+    def get_queryset(self):
+        return Recipe.objects.for_read(self.request.user)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        AuthorStats.objects.change_recipes_count(self.request.user, 1)
+        self.reload_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.reload_instance(serializer)
+
+    def reload_instance(self, serializer):
+        """Перечитать рецепт для ответа со всеми связанными данными."""
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
+    def get_recipe_state(self):
+        """
+        Дата изменения рецепта и флаги пользователя одним лёгким запросом.
+        None, если рецепт не найден.
+        """
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            return Recipe.objects.filter(pk=lookup).with_user_flags(
+                self.request.user
+            ).values(
+                'id', 'updated', 'is_favorited', 'is_in_shopping_cart',
+                'author_is_subscribed'
+            ).first()
+        except (TypeError, ValueError):
+            return None
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Рецепт с ETag и, для анонимных пользователей, Last-Modified:
+        повторный запрос с неизменившимся рецептом получает 304 без
+        сериализации.
+        """
+        state = self.get_recipe_state()
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = '"{}"'.format(
+            sha1(repr(sorted(state.items())).encode()).hexdigest())
+        last_modified = None
+        if request.user.is_anonymous:
+            last_modified = timegm(state['updated'].utctimetuple())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        AuthorStats.objects.change_recipes_count(instance.author, -1)
 
     @action(detail=True, methods=['get', 'delete'],
             permission_classes=[IsAuthenticated])
@@ -63,13 +152,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.delete_obj(Cart, request.user, pk)
         return None
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Последние рецепты авторов, на которых подписан пользователь.
+        Выдача всегда по курсору и без общего числа рецептов.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        paginator = MergedCursorPagination()
+        page = paginator.paginate_sources(
+            queryset, queryset.feed_sources(request.user), request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """
+        Рецепты, похожие на данный по ингредиентам и тегам. Несуществующий
+        или некорректный id даёт 404.
+        """
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        queryset = self.get_queryset().filter(
+            similar_to__recipe=recipe.pk
+        ).order_by('-similar_to__score', '-id')
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False)
+    def cook(self, request):
+        """
+        Рецепты, которые можно приготовить из имеющихся ингредиентов,
+        по убыванию доли ингредиентов рецепта, которые уже есть.
+        """
+        params = CookQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ranked = recipe_index.cook(
+            params.validated_data['ingredients'],
+            params.validated_data['min_coverage'],
+            params.validated_data['limit'],
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in ranked])
+        ranked = [item for item in ranked if item[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in ranked], many=True)
+        data = serializer.data
+        for item, (_, coverage, missing) in zip(data, ranked):
+            item['coverage'] = round(coverage, 3)
+            item['missing_ingredients'] = missing
+        return Response(data)
+
     @action(detail=False, methods=['get'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PDFRenderer, CSVRenderer, PlainTextRenderer],
+            content_negotiation_class=FileContentNegotiation)
     def download_shopping_cart(self, request):
-        """Скачать список покупок."""
+        """
+        Скачать список покупок в формате pdf, csv или txt. Без ?format=
+        и с любым другим Accept отдаётся pdf.
+        """
         user = request.user
-        return generate_pdf_shopping_list(user)
+        generate = SHOPPING_LIST_GENERATORS[request.accepted_renderer.format]
+        return generate(user)
 
+    @transaction.atomic
     def add_obj(self, model, user, pk):
         """Добавить рецепт."""
         if model.objects.filter(user=user, recipe__id=pk).exists():
@@ -81,6 +227,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = CropRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_obj(self, model, user, pk):
         """Удалить рецепт."""
         obj = model.objects.filter(user=user, recipe__id=pk)
@@ -0,0 +1,117 @@
+import base64
+import io
+from concurrent.futures import Future
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram import images, similar
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+class InlineExecutor:
+    """Выполняет фоновые задачи сразу, в потоке теста."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@pytest.fixture(autouse=True)
+def inline_background_tasks(monkeypatch):
+    monkeypatch.setattr(images, '_executor', InlineExecutor())
+    monkeypatch.setattr(similar, '_executor', InlineExecutor())
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def png_base64(size=(10, 10)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def users(db):
+    return [
+        User.objects.create_user(username=f'user{i}',
+                                 email=f'user{i}@example.com',
+                                 password='password-123')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def tags(db):
+    return [Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}',
+                               color=f'#00000{i}')
+            for i in range(3)]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [Ingredient.objects.create(name=f'ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(10)]
+
+
+@pytest.fixture
+def make_recipes(users, tags, ingredients):
+    """
+    Рецепты без обращения к API: i-й рецепт автора users[i % 3] с тегами
+    tags[:1 + i % 3] и ингредиентами i, i + 1, i + 2.
+    """
+    def make(count):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=users[i % 3], name=f'Рецепт {i}',
+                image='recipes/test.png', text='Описание', cooking_time=5)
+            recipe.tags.set(tags[:1 + i % 3])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(i + j) % len(ingredients)],
+                    amount=j + 1)
+                for j in range(3)
+            )
+            recipes.append(recipe)
+        return recipes
+    return make
+
+
+@pytest.fixture
+def recipe_payload(tags, ingredients):
+    def payload(**kwargs):
+        data = {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': png_base64(),
+            'tags': [tags[0].id],
+            'ingredients': [{'id': ingredients[0].id, 'amount': 2}],
+        }
+        data.update(kwargs)
+        return data
+    return payload
@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+from backend.settings import *  # noqa
+
+if not os.getenv('DB_ENGINE'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+
+# Миграции не хранятся в репозитории, схема создаётся по моделям.
+MIGRATION_MODULES = {'foodgram': None, 'users': None, 'api': None}
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+RESPONSE_CACHE_ALIAS = 'default'
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-test-media-')
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
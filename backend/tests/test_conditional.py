@@ -0,0 +1,37 @@
+from tests.conftest import client_for
+
+
+def test_etag_returns_not_modified(users, make_recipes):
+    recipe = make_recipes(1)[0]
+    client = client_for(users[0])
+    url = f'/api/recipes/{recipe.id}/'
+    response = client.get(url)
+    assert response.status_code == 200
+    assert 'Authorization' in response['Vary']
+    assert 'Last-Modified' not in response
+    etag = response['ETag']
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    client.get(f'{url}favorite/')
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()['is_favorited'] is True
+
+
+def test_last_modified_for_anonymous(users, tags, make_recipes):
+    recipe = make_recipes(1)[0]
+    client = client_for()
+    url = f'/api/recipes/{recipe.id}/'
+    last_modified = client.get(url)['Last-Modified']
+    response = client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == 304
+    etag = response['ETag']
+    tags[0].name = 'Новое имя'
+    tags[0].save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.json()['tags'][0]['name'] == 'Новое имя'
+
+
+def test_missing_recipe_is_not_found(db):
+    assert client_for().get('/api/recipes/0/').status_code == 404
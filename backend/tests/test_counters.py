@@ -0,0 +1,64 @@
+from django.core.management import call_command
+
+from foodgram.models import Cart, Favorite, Recipe, RecipeScore
+from tests.conftest import client_for
+
+
+def counters(recipe):
+    recipe = Recipe.objects.select_related('score').get(pk=recipe.pk)
+    return (recipe.favorites_count, recipe.in_carts_count,
+            recipe.score.popular, recipe.score.trending)
+
+
+def test_counters_follow_api(users, make_recipes):
+    recipe = make_recipes(1)[0]
+    for user in users[:2]:
+        client = client_for(user)
+        client.get(f'/api/recipes/{recipe.id}/favorite/')
+        client.get(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert counters(recipe) == (2, 2, 4, 4)
+    response = client_for(users[0]).delete(
+        f'/api/recipes/{recipe.id}/favorite/')
+    assert response.status_code == 204
+    assert counters(recipe) == (1, 2, 3, 3)
+
+
+def test_rows_created_outside_api_are_counted(users, make_recipes):
+    recipe = make_recipes(1)[0]
+    Favorite.objects.create(user=users[0], recipe=recipe)
+    Cart.objects.create(user=users[0], recipe=recipe)
+    assert counters(recipe) == (1, 1, 2, 2)
+    client = client_for(users[0])
+    assert client.delete(
+        f'/api/recipes/{recipe.id}/favorite/').status_code == 204
+    assert client.delete(
+        f'/api/recipes/{recipe.id}/shopping_cart/').status_code == 204
+    assert counters(recipe) == (0, 0, 0, 0)
+
+
+def test_counters_never_go_negative(users, make_recipes):
+    recipe = make_recipes(1)[0]
+    Favorite.objects.create(user=users[0], recipe=recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(favorites_count=0)
+    RecipeScore.objects.filter(recipe=recipe).update(popular=0, trending=0)
+    response = client_for(users[0]).delete(
+        f'/api/recipes/{recipe.id}/favorite/')
+    assert response.status_code == 204
+    assert counters(recipe) == (0, 0, 0, 0)
+
+
+def test_cascade_delete_updates_counters(users, make_recipes):
+    recipe = make_recipes(1)[0]
+    Favorite.objects.create(user=users[1], recipe=recipe)
+    Favorite.objects.create(user=users[2], recipe=recipe)
+    users[1].delete()
+    assert counters(recipe) == (1, 0, 1, 1)
+
+
+def test_reconcile_counters_repairs_drift(users, make_recipes):
+    recipe = make_recipes(1)[0]
+    Favorite.objects.create(user=users[0], recipe=recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+    call_command('reconcile_counters', '--repair')
+    assert Recipe.objects.get(pk=recipe.pk).favorites_count == 1
+    assert users[0].stats.recipes_count == 1
@@ -0,0 +1,105 @@
+import json
+
+from django.core.management import call_command
+
+from foodgram.models import FeedItem, PullFeedAuthor, Recipe
+from tests.conftest import client_for
+from users.models import Follow
+
+
+def follow(client, author):
+    response = client.get(f'/api/users/{author.id}/subscribe/')
+    assert response.status_code == 201
+
+
+def feed_ids(client, limit):
+    """Пройти ленту по курсору, вернуть id рецептов."""
+    ids, url = [], f'/api/recipes/feed/?limit={limit}'
+    while url:
+        data = client.get(url).json()
+        assert 'count' not in data
+        ids += [recipe['id'] for recipe in data['results']]
+        url = data['next']
+    return ids
+
+
+def test_feed_merges_pushed_and_pulled_authors(settings, users,
+                                               make_recipes):
+    recipes = make_recipes(9)
+    client = client_for(users[0])
+    follow(client, users[1])
+    settings.FEED_PULL_THRESHOLD = 1
+    follow(client, users[2])
+    assert PullFeedAuthor.objects.filter(author=users[2]).exists()
+    assert not FeedItem.objects.filter(author=users[2]).exists()
+    expected = [recipe.id for recipe in reversed(recipes)
+                if recipe.author != users[0]]
+    for limit in (1, 2, 4, 10):
+        assert feed_ids(client, limit) == expected
+
+
+def test_feed_follows_new_recipes(users, make_recipes, recipe_payload):
+    make_recipes(3)
+    client = client_for(users[0])
+    follow(client, users[1])
+    recipe_id = client_for(users[1]).post(
+        '/api/recipes/', recipe_payload(), format='json').json()['id']
+    first = client.get('/api/recipes/feed/?limit=1').json()['results'][0]
+    assert first['id'] == recipe_id
+    assert first['author']['is_subscribed'] is True
+    client.delete(f'/api/users/{users[1].id}/subscribe/')
+    assert feed_ids(client, 10) == []
+
+
+def test_feed_queries_do_not_depend_on_page_size(
+        settings, users, make_recipes, django_assert_num_queries):
+    make_recipes(30)
+    client = client_for(users[0])
+    follow(client, users[1])
+    settings.FEED_PULL_THRESHOLD = 1
+    follow(client, users[2])
+    # Токен, авторы с лентой при чтении, id из двух источников, страница
+    # рецептов и её теги и ингредиенты.
+    for limit in (2, 20):
+        with django_assert_num_queries(7):
+            response = client.get(f'/api/recipes/feed/?limit={limit}')
+        assert len(response.json()['results']) == limit
+
+
+def test_feed_requires_authentication(db):
+    assert client_for().get('/api/recipes/feed/').status_code == 401
+
+
+def test_build_feeds_backfills_existing_follows(settings, users,
+                                                make_recipes):
+    recipes = make_recipes(6)
+    Follow.objects.create(user=users[0], author=users[1])
+    Follow.objects.create(user=users[0], author=users[2])
+    Follow.objects.create(user=users[1], author=users[2])
+    client = client_for(users[0])
+    assert feed_ids(client, 10) == []
+    settings.FEED_PULL_THRESHOLD = 2
+    call_command('build_feeds')
+    call_command('build_feeds')
+    assert PullFeedAuthor.objects.filter(author=users[2]).exists()
+    assert FeedItem.objects.count() == 2
+    assert feed_ids(client, 10) == [recipe.id for recipe in reversed(recipes)
+                                    if recipe.author != users[0]]
+
+
+def test_recipes_outside_api_are_fanned_out(users, ingredients, tmp_path):
+    client = client_for(users[0])
+    follow(client, users[1])
+    created = Recipe.objects.create(
+        author=users[1], name='Из админки', image='recipes/test.png',
+        text='Описание', cooking_time=5)
+    path = tmp_path / 'recipes.json'
+    path.write_text(json.dumps([{
+        'name': 'Загруженный', 'text': 'Описание', 'cooking_time': 5,
+        'author': users[1].username, 'tags': [],
+        'ingredients': [{'name': 'соль', 'measurement_unit': 'г',
+                         'amount': 1}],
+    }]))
+    call_command('import_data', 'recipes', str(path))
+    imported = Recipe.objects.get(name='Загруженный')
+    assert feed_ids(client, 10) == [imported.id, created.id]
@@ -0,0 +1,24 @@
+from django.core.files.storage import default_storage
+
+from foodgram.models import Recipe
+from tests.conftest import client_for
+
+
+def test_stale_instance_keeps_renditions(users, recipe_payload,
+                                         django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = client_for(users[0]).post(
+            '/api/recipes/', recipe_payload(), format='json')
+    stale = Recipe.objects.get(pk=response.json()['id'])
+    for callback in callbacks:
+        callback()
+    renditions = Recipe.objects.get(pk=stale.pk).image_renditions
+    assert renditions['source'] == stale.image.name
+    stale.name = 'Новое название'
+    with django_capture_on_commit_callbacks(execute=True):
+        stale.save()
+    recipe = Recipe.objects.get(pk=stale.pk)
+    assert recipe.name == 'Новое название'
+    assert recipe.image_renditions == renditions
+    for path in renditions.values():
+        assert default_storage.exists(path)
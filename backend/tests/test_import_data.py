@@ -0,0 +1,81 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from foodgram.models import Ingredient, Recipe
+from users.models import AuthorStats
+
+
+def run(*args):
+    out, err = StringIO(), StringIO()
+    call_command('import_data', *args, stdout=out, stderr=err)
+    return out.getvalue(), err.getvalue()
+
+
+def recipe(author, name='Рецепт'):
+    return {
+        'name': name, 'text': 'Описание', 'cooking_time': 5,
+        'author': author, 'tags': ['tag0', 'tag1'],
+        'ingredients': [
+            {'name': 'соль', 'measurement_unit': 'г', 'amount': 3},
+            {'name': 'яйцо', 'measurement_unit': 'шт', 'amount': 1},
+        ],
+    }
+
+
+def test_ingredients_are_not_duplicated(db, tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps([
+        {'name': 'соль', 'measurement_unit': 'г'},
+        {'name': 'сахар', 'measurement_unit': 'г'},
+    ]))
+    run('ingredients', str(path))
+    run('ingredients', str(path))
+    csv_path = tmp_path / 'ingredients.csv'
+    csv_path.write_text('name,measurement_unit\nсоль,г\nперец,г\n')
+    run('ingredients', str(csv_path))
+    assert Ingredient.objects.count() == 3
+
+
+def test_recipes_are_loaded_in_batches(users, tags, tmp_path):
+    path = tmp_path / 'recipes.jsonl'
+    path.write_text('\n'.join(
+        json.dumps(recipe(users[0].username, f'Рецепт {i}'))
+        for i in range(7)))
+    run('recipes', str(path), '--batch-size', '3')
+    assert Recipe.objects.count() == 7
+    loaded = Recipe.objects.first()
+    assert loaded.tags.count() == 2
+    assert loaded.recipe_ingredient.count() == 2
+
+
+def test_recipes_from_csv_are_rejected(db, tmp_path):
+    path = tmp_path / 'recipes.csv'
+    path.write_text('name,text\nРецепт,Описание\n')
+    with pytest.raises(CommandError):
+        run('recipes', str(path))
+
+
+def test_unknown_authors_are_reported(users, tags, tmp_path):
+    path = tmp_path / 'recipes.json'
+    path.write_text(json.dumps([recipe(users[0].username), recipe('ghost')]))
+    out, err = run('recipes', str(path))
+    assert Recipe.objects.count() == 1
+    assert 'ghost' in err
+    assert 'Загружено 1 строк' in out
+
+
+def test_author_stats_follow_import(users, tags, make_recipes, tmp_path):
+    make_recipes(1)
+    AuthorStats.objects.change_recipes_count(users[1], 0)
+    path = tmp_path / 'recipes.jsonl'
+    path.write_text('\n'.join(
+        json.dumps(recipe(author.username, f'Рецепт {i}'))
+        for i, author in enumerate(users * 2)))
+    run('recipes', str(path), '--batch-size', '4')
+    assert dict(AuthorStats.objects.values_list(
+        'author', 'recipes_count')) == {
+        users[0].id: 3, users[1].id: 2, users[2].id: 2}
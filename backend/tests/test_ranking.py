@@ -0,0 +1,72 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from foodgram.models import Favorite, RecipeScore
+from tests.conftest import client_for
+
+
+def walk(client, url):
+    """Пройти выдачу по курсору, вернуть id рецептов и ответы."""
+    ids, pages = [], []
+    while url:
+        data = client.get(url).json()
+        pages.append(data)
+        ids += [recipe['id'] for recipe in data['results']]
+        url = data['next']
+    return ids, pages
+
+
+def test_scores_are_backfilled(users, make_recipes):
+    recipes = make_recipes(3)
+    RecipeScore.objects.filter(recipe=recipes[0]).delete()
+    Favorite.objects.create(user=users[0], recipe=recipes[1])
+    call_command('update_recipe_scores')
+    response = client_for().get('/api/recipes/?ordering=popular&limit=10')
+    assert [recipe['id'] for recipe in response.json()['results']] == [
+        recipes[1].id, recipes[2].id, recipes[0].id]
+
+
+def test_ranked_sql_follows_score_index(users, make_recipes):
+    make_recipes(3)
+    with CaptureQueriesContext(connection) as queries:
+        client_for().get(
+            '/api/recipes/?ordering=popular&pagination=cursor&limit=1')
+    sql = next(query['sql'] for query in queries.captured_queries
+               if 'ORDER BY' in query['sql'] and 'LIMIT' in query['sql'])
+    assert 'INNER JOIN "foodgram_recipescore"' in sql
+    assert '"foodgram_recipescore"."popular" AS "ranking"' in sql
+    assert '"foodgram_recipescore"."recipe_id" AS "ranked_id"' in sql
+    assert sql.endswith('ORDER BY "ranking" DESC, "ranked_id" DESC LIMIT 2')
+
+
+def test_cursor_walks_ties_without_gaps(users, make_recipes):
+    recipes = make_recipes(7)
+    Favorite.objects.create(user=users[0], recipe=recipes[3])
+    Favorite.objects.create(user=users[1], recipe=recipes[3])
+    Favorite.objects.create(user=users[0], recipe=recipes[5])
+    expected = [recipes[3].id, recipes[5].id] + [
+        recipe.id for recipe in reversed(recipes)
+        if recipe not in (recipes[3], recipes[5])]
+    client = client_for()
+    ids, pages = walk(
+        client, '/api/recipes/?ordering=trending&pagination=cursor&limit=2')
+    assert ids == expected
+    previous = client.get(pages[-1]['previous']).json()
+    assert previous['results'] == pages[-2]['results']
+
+
+def test_invalid_cursor_is_not_found(users, make_recipes):
+    make_recipes(1)
+    response = client_for().get(
+        '/api/recipes/?ordering=popular&cursor=cD1bXQ%3D%3D')
+    assert response.status_code == 404
+
+
+def test_anonymous_ranking_is_not_stale(users, make_recipes):
+    recipes = make_recipes(2)
+    client = client_for()
+    url = '/api/recipes/?ordering=popular&limit=1'
+    assert client.get(url).json()['results'][0]['id'] == recipes[1].id
+    client_for(users[0]).get(f'/api/recipes/{recipes[0].id}/favorite/')
+    assert client.get(url).json()['results'][0]['id'] == recipes[0].id
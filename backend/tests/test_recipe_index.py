@@ -0,0 +1,48 @@
+from foodgram.models import Recipe, RecipeIngredient, SimilarRecipe
+from foodgram.search import recipe_index
+from tests.conftest import client_for
+
+
+def cook(*ingredients, limit=20):
+    query = '&'.join(f'ingredients={item.id}' for item in ingredients)
+    response = client_for().get(f'/api/recipes/cook/?{query}&limit={limit}')
+    assert response.status_code == 200
+    return [(recipe['id'], recipe['coverage'],
+             recipe['missing_ingredients']) for recipe in response.json()]
+
+
+def test_cook_ranks_by_coverage(users, ingredients, make_recipes):
+    recipes = make_recipes(4)
+    assert cook(*ingredients[:3]) == [
+        (recipes[0].id, 1.0, 0), (recipes[1].id, 0.667, 1)]
+    assert cook(*ingredients[:3], limit=1) == [(recipes[0].id, 1.0, 0)]
+
+
+def test_sync_picks_up_changes(users, ingredients, make_recipes,
+                               django_capture_on_commit_callbacks):
+    recipes = make_recipes(3)
+    assert recipe_index.recipe_ids() == sorted(r.id for r in recipes)
+    with django_capture_on_commit_callbacks(execute=True):
+        RecipeIngredient.objects.create(
+            recipe=recipes[2], ingredient=ingredients[0], amount=1)
+    assert cook(ingredients[0], ingredients[2]) == [
+        (recipes[0].id, 0.667, 1), (recipes[2].id, 0.5, 2)]
+
+
+def test_sync_drops_deleted_recipe_of_same_count(
+        users, ingredients, make_recipes,
+        django_capture_on_commit_callbacks):
+    recipes = make_recipes(3)
+    recipe_index.recipe_ids()
+    with django_capture_on_commit_callbacks(execute=True):
+        recipes[0].delete()
+        replacement = Recipe.objects.create(
+            author=users[0], name='Замена', image='recipes/test.png',
+            text='Описание', cooking_time=5)
+        RecipeIngredient.objects.create(
+            recipe=replacement, ingredient=ingredients[9], amount=1)
+    assert recipe_index.recipe_ids() == sorted(
+        [recipes[1].id, recipes[2].id, replacement.id])
+    assert cook(*ingredients[:3], limit=1) == [(recipes[1].id, 0.667, 1)]
+    assert not SimilarRecipe.objects.filter(
+        similar_id=recipes[0].id).exists()
@@ -0,0 +1,59 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from foodgram.models import Favorite
+from tests.conftest import client_for
+from users.models import Follow
+
+
+@pytest.mark.parametrize('authenticated', [False, True])
+def test_recipe_list_queries_do_not_depend_on_page_size(
+        authenticated, users, make_recipes, django_assert_num_queries):
+    make_recipes(30)
+    client = client_for(users[0] if authenticated else None)
+    # Токен, страница, COUNT, теги и ингредиенты.
+    expected = 5 if authenticated else 4
+    for limit in (2, 20):
+        with django_assert_num_queries(expected):
+            response = client.get(f'/api/recipes/?limit={limit}')
+        assert response.status_code == 200
+        assert len(response.json()['results']) == limit
+
+
+def test_recipe_list_user_flags(users, make_recipes):
+    recipes = make_recipes(6)
+    Favorite.objects.create(user=users[0], recipe=recipes[0])
+    Follow.objects.create(user=users[0], author=users[1])
+    results = client_for(users[0]).get(
+        '/api/recipes/?limit=10').json()['results']
+    favorited = [item['id'] for item in results if item['is_favorited']]
+    assert favorited == [recipes[0].id]
+    for item in results:
+        assert item['author']['is_subscribed'] == (
+            item['author']['id'] == users[1].id)
+    anonymous = client_for().get('/api/recipes/?limit=10').json()['results']
+    assert not any(item['is_favorited'] for item in anonymous)
+
+
+def test_similar_recipes(users, make_recipes):
+    recipes = make_recipes(4)
+    call_command('build_similar_recipes', stdout=StringIO())
+    client = client_for()
+    response = client.get(f'/api/recipes/{recipes[1].id}/similar/')
+    assert response.status_code == 200
+    assert {item['id'] for item in response.json()[:2]} == {
+        recipes[0].id, recipes[2].id}
+    assert client.get('/api/recipes/0/similar/').status_code == 404
+    assert client.get('/api/recipes/abc/similar/').status_code == 404
+
+
+@pytest.mark.parametrize('item', [{}, {'amount': 'abc'}, {'amount': None}])
+def test_invalid_ingredient_amount(item, users, ingredients,
+                                   recipe_payload):
+    ingredient = {'id': ingredients[0].id, **item}
+    response = client_for(users[0]).post(
+        '/api/recipes/', recipe_payload(ingredients=[ingredient]),
+        format='json')
+    assert response.status_code == 400
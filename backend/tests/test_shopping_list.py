@@ -0,0 +1,106 @@
+from django.core.management import call_command
+
+from foodgram.models import Cart, RecipeIngredient, ShoppingListItem
+from tests.conftest import client_for
+
+
+def totals(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount'))
+
+
+def test_totals_follow_cart(users, ingredients, make_recipes):
+    recipes = make_recipes(2)
+    client = client_for(users[0])
+    for recipe in recipes:
+        assert client.get(
+            f'/api/recipes/{recipe.id}/shopping_cart/').status_code == 201
+    assert totals(users[0]) == {
+        ingredients[0].id: 1, ingredients[1].id: 3,
+        ingredients[2].id: 5, ingredients[3].id: 3,
+    }
+    assert client.delete(
+        f'/api/recipes/{recipes[0].id}/shopping_cart/').status_code == 204
+    assert totals(users[0]) == {
+        ingredients[1].id: 1, ingredients[2].id: 2, ingredients[3].id: 3,
+    }
+
+
+def test_totals_follow_recipe_changes(users, tags, ingredients,
+                                      recipe_payload):
+    author = client_for(users[0])
+    recipe_id = author.post('/api/recipes/', recipe_payload(),
+                            format='json').json()['id']
+    buyer = client_for(users[1])
+    buyer.get(f'/api/recipes/{recipe_id}/shopping_cart/')
+    assert totals(users[1]) == {ingredients[0].id: 2}
+    author.patch(f'/api/recipes/{recipe_id}/', recipe_payload(ingredients=[
+        {'id': ingredients[1].id, 'amount': 7},
+    ]), format='json')
+    assert totals(users[1]) == {ingredients[1].id: 7}
+    author.delete(f'/api/recipes/{recipe_id}/')
+    assert totals(users[1]) == {}
+
+
+def test_apply_deltas_reuses_existing_rows(users, ingredients):
+    ShoppingListItem.objects.create(user=users[0],
+                                    ingredient=ingredients[0], amount=1)
+    ShoppingListItem.objects.apply_deltas(
+        [users[0].id, users[1].id],
+        {ingredients[0].id: 2, ingredients[1].id: 3})
+    assert totals(users[0]) == {ingredients[0].id: 3, ingredients[1].id: 3}
+    assert totals(users[1]) == {ingredients[0].id: 2, ingredients[1].id: 3}
+
+
+def test_download_formats(users, make_recipes):
+    recipe = make_recipes(1)[0]
+    client = client_for(users[0])
+    client.get(f'/api/recipes/{recipe.id}/shopping_cart/')
+    response = client.get('/api/recipes/download_shopping_cart/?format=txt')
+    assert response.status_code == 200
+    assert 'ингредиент 0' in b''.join(response.streaming_content).decode()
+    response = client.get('/api/recipes/download_shopping_cart/?format=csv')
+    assert response.status_code == 200
+    for accept in ('application/json', '*/*'):
+        response = client.get('/api/recipes/download_shopping_cart/',
+                              HTTP_ACCEPT=accept)
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/pdf'
+
+
+def test_totals_follow_orm_changes(users, ingredients, make_recipes):
+    recipes = make_recipes(2)
+    for recipe in recipes:
+        Cart.objects.create(user=users[0], recipe=recipe)
+    assert totals(users[0]) == {
+        ingredients[0].id: 1, ingredients[1].id: 3,
+        ingredients[2].id: 5, ingredients[3].id: 3,
+    }
+    item = RecipeIngredient.objects.get(recipe=recipes[1],
+                                        ingredient=ingredients[3])
+    item.amount = 10
+    item.save()
+    RecipeIngredient.objects.filter(recipe=recipes[1],
+                                    ingredient=ingredients[1]).delete()
+    RecipeIngredient.objects.create(recipe=recipes[1],
+                                    ingredient=ingredients[5], amount=4)
+    assert totals(users[0]) == {
+        ingredients[0].id: 1, ingredients[1].id: 2, ingredients[2].id: 5,
+        ingredients[3].id: 10, ingredients[5].id: 4,
+    }
+    recipes[0].delete()
+    assert totals(users[0]) == {
+        ingredients[2].id: 2, ingredients[3].id: 10, ingredients[5].id: 4,
+    }
+    Cart.objects.filter(user=users[0]).delete()
+    assert totals(users[0]) == {}
+
+
+def test_check_shopping_lists_backfills(users, ingredients, make_recipes):
+    recipe = make_recipes(1)[0]
+    Cart.objects.create(user=users[0], recipe=recipe)
+    ShoppingListItem.objects.all().delete()
+    call_command('check_shopping_lists', '--repair')
+    assert totals(users[0]) == {
+        ingredients[0].id: 1, ingredients[1].id: 2, ingredients[2].id: 3,
+    }
@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+
+from tests.conftest import client_for
+from users.models import Follow
+
+User = get_user_model()
+
+
+def test_subscriptions_queries_do_not_depend_on_page_size(
+        users, make_recipes, django_assert_num_queries):
+    make_recipes(30)
+    authors = users[1:] + [
+        User.objects.create_user(username=f'author{i}',
+                                 email=f'author{i}@example.com')
+        for i in range(10)
+    ]
+    for author in authors:
+        Follow.objects.create(user=users[0], author=author)
+    client = client_for(users[0])
+    # Токен, COUNT, страница подписок и рецепты авторов.
+    for limit in (2, 12):
+        with django_assert_num_queries(4):
+            response = client.get(
+                f'/api/users/subscriptions/?limit={limit}&recipes_limit=2')
+        assert response.status_code == 200
+    results = {item['id']: item for item in response.json()['results']}
+    assert results[users[1].id]['recipes_count'] == 10
+    assert len(results[users[1].id]['recipes']) == 2
+    assert results[authors[-1].id]['recipes_count'] == 0
+
+
+def test_user_list_queries_do_not_depend_on_page_size(
+        users, django_assert_num_queries):
+    for i in range(20):
+        User.objects.create_user(username=f'extra{i}',
+                                 email=f'extra{i}@example.com')
+    Follow.objects.create(user=users[0], author=users[1])
+    client = client_for(users[0])
+    # Токен, COUNT и страница пользователей с флагом подписки.
+    for limit in (2, 20):
+        with django_assert_num_queries(3):
+            response = client.get(f'/api/users/?limit={limit}')
+        assert response.status_code == 200
+    subscribed = [item['id'] for item in client.get(
+        '/api/users/?limit=100').json()['results'] if item['is_subscribed']]
+    assert subscribed == [users[1].id]
@@ -9,12 +9,17 @@ User = get_user_model()
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'user')
+    list_select_related = ('author', 'user')
+    autocomplete_fields = ('author', 'user')
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
 class ReUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name')
-    list_filter = ('email', 'username')
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('^username', '^email', 'first_name', 'last_name')
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import F
 
 User = get_user_model()
 
@@ -29,3 +30,43 @@ class Follow(models.Model):
                 name='unique follow',
             )
         ]
+
+
+class AuthorStatsManager(models.Manager):
+
+    def change_recipes_count(self, author, delta):
+        """
+        Изменить счётчик рецептов автора на delta. Вызывается после
+        изменения, поэтому новая запись получает точное число рецептов.
+        """
+        lookup = self.filter(author=author)
+        if lookup.update(recipes_count=F('recipes_count') + delta):
+            return
+        _, created = self.get_or_create(
+            author=author,
+            defaults={'recipes_count': author.recipes.count()},
+        )
+        if not created:
+            lookup.update(recipes_count=F('recipes_count') + delta)
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые дорого считать при каждом запросе."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, verbose_name='Число рецептов')
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'Статистика {self.author}'
@@ -8,6 +8,18 @@ from users.models import Follow
 User = get_user_model()
 
 
+def get_followed_ids(request):
+    """
+    Множество id авторов, на которых подписан пользователь запроса.
+    Загружается один раз и переиспользуется всеми сериализаторами ответа.
+    """
+    if not hasattr(request, 'followed_ids'):
+        request.followed_ids = set(Follow.objects.filter(
+            user=request.user
+        ).values_list('author_id', flat=True))
+    return request.followed_ids
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Сериализатор модели User POST запрос."""
     email = serializers.EmailField(
@@ -42,7 +54,9 @@ class CustomUserSerializer(UserSerializer):
         """
         Статус подписки пользователя на юзеров.
         """
-        user = self.context.get('request').user
-        if user.is_anonymous:
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if request.user.is_anonymous:
             return False
-        return Follow.objects.filter(user=user, author=obj.id).exists()
+        return obj.id in get_followed_ids(request)
@@ -1,21 +1,75 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from api.pagination import LimitPageNumberPagination
 from api.serializers import FollowSerializer
+from foodgram.models import FeedItem, Recipe
 from users.models import Follow
 
 User = get_user_model()
 
 
+def recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    limit = request.query_params.get('recipes_limit')
+    if limit is None:
+        return None
+    try:
+        return max(int(limit), 0)
+    except ValueError:
+        raise ValidationError({'recipes_limit': 'Ожидается целое число'})
+
+
 class CustomUserViewSet(UserViewSet):
     pagination_class = LimitPageNumberPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action != 'list' or not user.is_authenticated:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
+    def get_subscriptions_queryset(self, user, limit=None):
+        """
+        Подписки пользователя с числом рецептов автора и первыми limit
+        рецептами каждого автора, загруженными одним запросом. Число
+        рецептов читается из счётчика автора, а пока его нет, считается.
+        """
+        recipes = Recipe.objects.order_by('-id')
+        if limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author'))
+                .order_by('-id').values('id')[:limit]
+            ))
+        return Follow.objects.filter(user=user).select_related(
+            'author'
+        ).annotate(
+            recipes_count=Coalesce(
+                'author__stats__recipes_count',
+                Subquery(
+                    Recipe.objects.filter(author=OuterRef('author'))
+                    .order_by().values('author')
+                    .annotate(count=Count('pk')).values('count')
+                ),
+                Value(0),
+            ),
+        ).prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='recipes_preview'),
+        )
+
     @action(detail=True, permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
         user = request.user
@@ -30,7 +84,9 @@ class CustomUserViewSet(UserViewSet):
                 'errors': 'Вы уже подписаны на данного пользователя'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        follow = Follow.objects.create(user=user, author=author)
+        with transaction.atomic():
+            follow = Follow.objects.create(user=user, author=author)
+            FeedItem.objects.follow(user, author)
         serializer = FollowSerializer(
             follow, context={'request': request}
         )
@@ -46,7 +102,9 @@ class CustomUserViewSet(UserViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         follow = Follow.objects.filter(user=user, author=author)
         if follow.exists():
-            follow.delete()
+            with transaction.atomic():
+                follow.delete()
+                FeedItem.objects.unfollow(user, author)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response({
@@ -56,7 +114,8 @@ class CustomUserViewSet(UserViewSet):
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = self.get_subscriptions_queryset(
+            user, recipes_limit(request))
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages,